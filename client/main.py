@@ -1,13 +1,27 @@
 import os
+import sys
 import json
 import re
+import time
+import uuid
+import hashlib
+import sqlite3
+import threading
+import random
+import asyncio
+import argparse
+import xml.etree.ElementTree as ET
+from contextvars import ContextVar
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain.tools import Tool
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-import requests
-from typing import Dict, Any, List
+from langchain.callbacks.base import AsyncCallbackHandler
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+import httpx
+from typing import Dict, Any, List, Literal
 
 from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
@@ -27,6 +41,18 @@ class PromptResponse(BaseModel):
     console_logs: str
     model_actions: str | None = None
     screenshots: str | None = None
+    tokens: dict | None = None
+    llm_cache: dict | None = None
+    tool_calls: list | None = None
+    prefetch: dict | None = None
+    cascade: list | None = None
+
+# Pydantic model for suite run request
+class SuiteRequest(BaseModel):
+    suite: str
+    format: Literal["yaml", "jsonl"] = "yaml"
+    name: str | None = None
+    concurrency: int | None = None
 
 # Create FastAPI app
 app = FastAPI(
@@ -58,6 +84,367 @@ async def verify_api_key(x_api_key: str = Header(None)):
         )
     return x_api_key
 
+class SharedCrawls:
+    """Crawl results shared by the QA runs of a suite, so each URL is crawled once per suite run."""
+    def __init__(self):
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.requests = 0
+        self.deduplicated = 0
+
+    async def get(self, url: str, fetch) -> Dict[str, Any]:
+        self.requests += 1
+        task = self.tasks.get(url)
+        if task is not None and task.done() and (task.cancelled() or task.exception() is not None):
+            # A failed crawl is not shared: the next caller crawls again
+            task = None
+        if task is None:
+            task = asyncio.ensure_future(fetch(url))
+            self.tasks[url] = task
+        else:
+            self.deduplicated += 1
+            print(f"[debug-client] Reusing crawl of {url} from this suite run")
+        # Shielded so that a cancelled run does not cancel a crawl other runs are waiting for
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "unique_urls": len(self.tasks), "deduplicated": self.deduplicated}
+
+class QARunContext:
+    """Side outputs of the tools for a single QA run (one per /process-prompt request)."""
+    def __init__(self, shared_crawls: SharedCrawls | None = None):
+        # One entry per browser_agent call (several can run in parallel in the same turn)
+        self.browser_model_actions: List[str] = []
+        self.browser_screenshots: List[str] = []
+        self.shared_crawls = shared_crawls
+        self.tokens = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self.llm_cache = {"hits": 0, "misses": 0}
+        # Output of each browser flow of the run, reused when a stronger model re-plans the run
+        self.browser_results: Dict[str, str] = {}
+        # Speculative crawls started from the URLs in the prompt, by normalized URL
+        self.prefetched: Dict[str, asyncio.Task] = {}
+        self.prefetch_used: set = set()
+        # Start offset and duration of every tool call, to see which calls overlapped
+        self.started = time.perf_counter()
+        self.tool_calls: List[Dict[str, Any]] = []
+
+    def record_tool_call(self, tool: str, tool_input: str, start: float):
+        self.tool_calls.append({
+            "tool": tool,
+            "input": tool_input[:200],
+            "started_at": round(start - self.started, 3),
+            "seconds": round(time.perf_counter() - start, 3)
+        })
+
+    @staticmethod
+    def merge_outputs(values: List[str]) -> str | None:
+        """Merge the JSON-list outputs of several browser_agent calls into one JSON list."""
+        if not values:
+            return None
+        if len(values) == 1:
+            return values[0]
+        merged = []
+        for value in values:
+            try:
+                parsed = json.loads(value)
+            except (TypeError, ValueError):
+                parsed = value
+            merged.extend(parsed if isinstance(parsed, list) else [parsed])
+        return json.dumps(merged, ensure_ascii=False)
+
+URL_RE = re.compile(r"https?://[^\s<>\"'`)\]]+")
+
+def extract_urls(text: str) -> List[str]:
+    """URLs mentioned in a prompt, in order and without duplicates or trailing punctuation."""
+    urls = []
+    for match in URL_RE.findall(text):
+        url = match.rstrip(".,;:!?")
+        if url_key(url) not in {url_key(existing) for existing in urls}:
+            urls.append(url)
+    return urls
+
+def url_key(url: str) -> str:
+    return url.rstrip("/")
+
+# USD per 1M tokens (input, output); QA_MODEL_PRICES can add or override models as JSON
+MODEL_PRICES = {
+    "gpt-3.5-turbo-1106": (1.00, 2.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    **{model: tuple(prices) for model, prices in json.loads(os.getenv("QA_MODEL_PRICES", "{}")).items()}
+}
+
+CONFIDENCE_LEVELS = {"low": 0, "medium": 1, "high": 2}
+CONFIDENCE_RE = re.compile(r"^\s*CONFIDENCE:\s*(high|medium|low)\b.*$", re.IGNORECASE | re.MULTILINE)
+
+def token_cost(model: str, tokens: Dict[str, int]) -> float | None:
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return round((tokens["prompt_tokens"] * prices[0] + tokens["completion_tokens"] * prices[1]) / 1_000_000, 6)
+
+def parse_verdict(agent_response: str) -> tuple:
+    """
+    Return (verdict, confidence, text) of an agent answer. verdict is None when the answer has
+    no BUG_DETECTED/PASSED marker; a missing confidence line counts as "medium".
+    """
+    match = CONFIDENCE_RE.search(agent_response)
+    confidence = match.group(1).lower() if match else "medium"
+    text = CONFIDENCE_RE.sub("", agent_response).strip()
+    if "BUG_DETECTED:" in text:
+        return "failed", confidence, text.replace("BUG_DETECTED:", "").strip()
+    if "PASSED:" in text:
+        return "passed", confidence, text.replace("PASSED:", "").strip()
+    return None, confidence, text
+
+class TokenUsageCallback(AsyncCallbackHandler):
+    """
+    Adds the OpenAI token usage of every LLM call to the run context. Usage is read from the
+    usage_metadata of each generated message, which is also set on streamed generations
+    (llm_output["token_usage"] is not); answers served from the LLM cache count no tokens.
+    """
+    def __init__(self, run: QARunContext):
+        self.run = run
+
+    async def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage or message.response_metadata.get("cached"):
+                    continue
+                self.run.tokens["prompt_tokens"] += usage.get("input_tokens", 0)
+                self.run.tokens["completion_tokens"] += usage.get("output_tokens", 0)
+                self.run.tokens["total_tokens"] += usage.get("total_tokens", 0)
+
+class DiskLLMCache(BaseCache):
+    """
+    Exact-match cache of LLM responses in SQLite with LRU eviction. The key covers the model
+    parameters and bound functions (llm_string) and the full message list, which includes the
+    tool outputs of the agent scratchpad. Hits and misses are counted on the current run.
+    """
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    generations TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str):
+        key = self._key(prompt, llm_string)
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT generations FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        if row is None:
+            return None
+        generations = [loads(generation) for generation in json.loads(row[0])]
+        for generation in generations:
+            # Marks the answer as served from the cache, so its stored token usage is not counted again
+            if getattr(generation, "message", None) is not None:
+                generation.message.response_metadata["cached"] = True
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val):
+        generations = json.dumps([dumps(generation) for generation in return_val])
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, generations, last_used) VALUES (?, ?, ?)",
+                (self._key(prompt, llm_string), generations, time.time())
+            )
+            # Evict the least recently used entries above the limit
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self, **kwargs):
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    async def alookup(self, prompt: str, llm_string: str):
+        result = await asyncio.to_thread(self.lookup, prompt, llm_string)
+        run = current_run.get(None)
+        if result is not None:
+            self.hits += 1
+            if run is not None:
+                run.llm_cache["hits"] += 1
+        else:
+            self.misses += 1
+            if run is not None:
+                run.llm_cache["misses"] += 1
+        return result
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val):
+        await asyncio.to_thread(self.update, prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs):
+        await asyncio.to_thread(self.clear)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        with self._connect() as conn:
+            entries = conn.execute("SELECT count(*) FROM llm_cache").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "entries": entries,
+            "max_entries": self.max_entries
+        }
+
+def hit_rate(counters: Dict[str, int]) -> float | None:
+    lookups = counters["hits"] + counters["misses"]
+    return round(counters["hits"] / lookups, 3) if lookups else None
+
+# Run context of the request being processed; each request's task sees its own value
+current_run: ContextVar[QARunContext] = ContextVar("current_run")
+
+class ServerTransport:
+    """
+    Pooled keep-alive HTTP connection to the QA server shared by all tool calls.
+    Idempotent calls are retried with exponential backoff and full jitter.
+    """
+    RETRY_STATUS_CODES = {502, 503, 504}
+
+    def __init__(self, base_url: str, api_key: str, uds: str | None = None):
+        self.base_url = base_url
+        self.uds = uds
+        self.retries = int(os.getenv("QA_SERVER_RETRIES", "2"))
+        self.retry_backoff = float(os.getenv("QA_SERVER_RETRY_BACKOFF", "0.5"))
+        http2 = os.getenv("QA_SERVER_HTTP2", "false").lower() == "true"
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("[debug-client] QA_SERVER_HTTP2 requires the h2 package (pip install httpx[http2]); using HTTP/1.1")
+                http2 = False
+        self.http2 = http2
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("QA_SERVER_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("QA_SERVER_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("QA_SERVER_KEEPALIVE_EXPIRY", "60"))
+        )
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"x-api-key": api_key},
+            # With a Unix domain socket the host in base_url is only used for the Host header
+            transport=httpx.AsyncHTTPTransport(uds=uds, http2=http2, limits=limits),
+            timeout=httpx.Timeout(
+                connect=float(os.getenv("QA_SERVER_CONNECT_TIMEOUT", "5")),
+                read=float(os.getenv("QA_SERVER_READ_TIMEOUT", "600")),
+                write=30.0,
+                pool=float(os.getenv("QA_SERVER_CONNECT_TIMEOUT", "5"))
+            )
+        )
+        self.counters = {"requests": 0, "connections_opened": 0, "retries": 0, "failures": 0}
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        # httpcore reports every new connection; requests without one reused a pooled connection
+        if event_name.startswith("connection.connect_") and event_name.endswith(".complete"):
+            self.counters["connections_opened"] += 1
+
+    async def post(self, path: str, payload: Dict[str, Any], idempotent: bool = False) -> Dict[str, Any]:
+        """POST a JSON payload and return the JSON response; only idempotent calls are retried."""
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            self.counters["requests"] += 1
+            try:
+                response = await self.client.post(path, json=payload, extensions={"trace": self._trace})
+                if response.status_code in self.RETRY_STATUS_CODES and attempt < attempts - 1:
+                    raise httpx.HTTPStatusError(f"Server returned {response.status_code}",
+                                                request=response.request, response=response)
+                response.raise_for_status()
+                return response.json()
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = isinstance(e, httpx.TransportError) or e.response.status_code in self.RETRY_STATUS_CODES
+                if not retryable or attempt == attempts - 1:
+                    self.counters["failures"] += 1
+                    raise
+                delay = random.uniform(0, self.retry_backoff * 2 ** attempt)
+                self.counters["retries"] += 1
+                print(f"[debug-client] {path} failed ({str(e) or type(e).__name__}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection reuse statistics since startup."""
+        requests_sent = self.counters["requests"]
+        reused = max(requests_sent - self.counters["connections_opened"], 0)
+        return {
+            "transport": "uds" if self.uds else "http",
+            **self.counters,
+            "reused_requests": reused,
+            "reuse_rate": round(reused / requests_sent, 3) if requests_sent else None,
+            "http2": self.http2
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+class InProcessTransport:
+    """
+    Calls the server tool endpoints directly in this process, without sockets or JSON
+    round-trips. Needs the server dependencies installed next to the client.
+    """
+    def __init__(self):
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if repo_root not in sys.path:
+            sys.path.insert(0, repo_root)
+        from server import main as server_main
+        self.server = server_main
+        self.routes = {
+            "/crawl": (server_main.crawl_website, server_main.CrawlRequest),
+            "/browser-agent": (server_main.browser_agent, server_main.BrowserAgentRequest)
+        }
+        self.counters = {"requests": 0, "failures": 0}
+
+    async def post(self, path: str, payload: Dict[str, Any], idempotent: bool = False) -> Dict[str, Any]:
+        """Call the server endpoint function for path; the API key check is skipped in-process."""
+        endpoint, request_model = self.routes[path]
+        self.counters["requests"] += 1
+        try:
+            response = await endpoint(request_model(**payload), None)
+        except Exception:
+            self.counters["failures"] += 1
+            raise
+        return response.model_dump()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"transport": "inprocess", **self.counters}
+
+    async def close(self):
+        # The server app is not running its own lifespan here, so release its resources
+        await self.server.shutdown_event()
+
+def create_server_transport(server_url: str, api_key: str):
+    """Build the transport selected by QA_SERVER_TRANSPORT: http (default), uds or inprocess."""
+    transport = os.getenv("QA_SERVER_TRANSPORT", "http").lower()
+    if transport == "uds":
+        return ServerTransport(server_url, api_key, uds=os.getenv("QA_SERVER_SOCKET", "/tmp/qa_server.sock"))
+    if transport == "inprocess":
+        return InProcessTransport()
+    if transport != "http":
+        raise ValueError(f"Unknown QA_SERVER_TRANSPORT: {transport}")
+    return ServerTransport(server_url, api_key)
+
 class QAAgent:
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
@@ -75,23 +462,64 @@ class QAAgent:
         if not self.qa_api_key:
             raise ValueError("QA_API_KEY not found in environment variables")
         
-        # create llm
-        self.llm = ChatOpenAI(
-            model="gpt-3.5-turbo-1106",
-            temperature=0,
-            api_key=self.api_key
-        )
+        # Exact-match LLM response cache (temperature=0 makes reruns deterministic)
+        self.llm_cache = None
+        if os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true":
+            self.llm_cache = DiskLLMCache(
+                os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.db")),
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+            )
+        
+        # Model cascade: the first (cheapest) model answers first; the run escalates to the next
+        # model when the answer has no verdict or its confidence is below QA_CASCADE_MIN_CONFIDENCE
+        self.cascade_models = [
+            model.strip() for model in os.getenv("QA_MODEL_CASCADE", "gpt-3.5-turbo-1106,gpt-4o").split(",") if model.strip()
+        ]
+        if not self.cascade_models:
+            raise ValueError("QA_MODEL_CASCADE must list at least one model")
+        self.min_confidence = os.getenv("QA_CASCADE_MIN_CONFIDENCE", "medium").lower()
+        if self.min_confidence not in CONFIDENCE_LEVELS:
+            raise ValueError(f"Invalid QA_CASCADE_MIN_CONFIDENCE: {self.min_confidence}")
+        self.cascade_stats = {
+            model: {"runs": 0, "escalations": 0, "latency_seconds": 0.0, "cost_usd": 0.0}
+            for model in self.cascade_models
+        }
+        
+        # create one llm per cascade tier
+        self.llms = [
+            ChatOpenAI(
+                model=model,
+                temperature=0,
+                api_key=self.api_key,
+                # The agent executor calls the model through astream, which bypasses the cache;
+                # with streaming disabled astream falls back to a cached ainvoke
+                disable_streaming=True,
+                cache=self.llm_cache if self.llm_cache is not None else False
+            )
+            for model in self.cascade_models
+        ]
+        self.llm = self.llms[0]
+
+        # Speculative crawls of the URLs found in the prompt, started before the agent plans
+        self.prefetch_enabled = os.getenv("CRAWL_PREFETCH_ENABLED", "true").lower() == "true"
+        self.prefetch_max_urls = int(os.getenv("CRAWL_PREFETCH_MAX_URLS", "3"))
+        self.prefetch_stats = {"started": 0, "used": 0, "wasted": 0, "wasted_in_flight": 0}
+        
+        # Pooled async transport shared by all requests, so tool calls never block the event loop
+        self.transport = create_server_transport(self.server_url, self.qa_api_key)
 
-        # create tools with functions and description
+        # create tools with async functions and description
         self.tools = [
             Tool(
                 name="crawl_website",
-                func=self.crawl_website,
+                func=None,
+                coroutine=self.crawl_website,
                 description="Crawls a website and returns its content in markdown format. Use this to analyze website content, structure, and verify content integrity."
             ),
             Tool(
                 name="browser_agent",
-                func=self.browser_agent,
+                func=None,
+                coroutine=self.browser_agent,
                 description="Runs a browser automation agent to test user flows, interactions, and validate critical functionality. Use this for testing user journeys and interactive elements."
             )
         ]
@@ -189,6 +617,12 @@ When responding:
 - Consider both functional and non-functional testing aspects
 - Document any issues found during browser or crawl testing
 
+PARALLEL TOOL CALLS:
+- Plan every tool call the request needs and issue them ALL in your first turn; they run concurrently
+- For example, crawl each URL that must be checked and run the browser flow in the same turn
+- You only get one round of tool calls, then you must answer
+- Merge the results of all tool calls into a single verdict: any issue in any result means BUG_DETECTED
+
 CRITICAL INSTRUCTION FOR BROWSER_AGENT:
 - When using browser_agent(), you MUST pass the COMPLETE ORIGINAL USER PROMPT as the parameter
 - Do not modify, summarize, or change the original prompt when calling browser_agent()
@@ -210,36 +644,43 @@ RESPONSE FORMAT:
 - If you find ANY significant issues, respond with "BUG_DETECTED: " at the beginning of your message
 - If everything appears to be working correctly and no issues are found, respond with "PASSED: " at the beginning of your message
 - Always provide detailed explanation of what was tested and what issues (if any) were found
+- End your message with a final line "CONFIDENCE: high", "CONFIDENCE: medium" or "CONFIDENCE: low" stating how sure you are of the verdict (use low when the tool results were incomplete or ambiguous)
 
 Remember to always prioritize software quality and user experience in your responses. Be extremely thorough and don't overlook any potential issues."""),
             ("human", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
 
-        # create agent with llm, tools and prompt
-        self.agent = create_openai_functions_agent(self.llm, self.tools, self.prompt)
+        # create agent with llm, tools and prompt (one per cascade tier)
+        # Tools agent: the model can request several tool calls in one turn (parallel function calling)
+        self.agents = [create_openai_tools_agent(llm, self.tools, self.prompt) for llm in self.llms]
+        self.agent = self.agents[0]
 
         # create executor with agent and tools context
         self.agent_executor = AgentExecutor(agent=self.agent, tools=self.tools, verbose=True)    
 
-        # Initialize browser agent result storage
-        self.last_browser_model_actions = None
-        self.last_browser_screenshots = None
-
     
     # crawl website function for tool
-    def crawl_website(self, url: str) -> str:
+    async def crawl_website(self, url: str) -> str:
         """Crawl a website and return its markdown content for content analysis."""
         try:
             print(f"[debug-client] crawl_website({url})")
             print(f"[debug-client] Connecting to server at: {self.server_url}")
-            response = requests.post(
-                f"{self.server_url}/crawl",
-                json={"url": url},
-                headers={"x-api-key": self.qa_api_key}
-            )
-            response.raise_for_status()
-            result = response.json()
+            run = current_run.get()
+            start = time.perf_counter()
+            prefetch = run.prefetched.get(url_key(url))
+            if prefetch is not None:
+                # Served from the speculative crawl started with the request (in flight or finished)
+                run.prefetch_used.add(url_key(url))
+                print(f"[debug-client] Using prefetched crawl of {url}")
+                try:
+                    result = await asyncio.shield(prefetch)
+                except Exception as e:
+                    print(f"[debug-client] Prefetched crawl of {url} failed ({str(e)}), crawling again")
+                    result = await self.crawl_for_run(run, url)
+            else:
+                result = await self.crawl_for_run(run, url)
+            run.record_tool_call("crawl_website", url, start)
             
             response_text = f"Successfully crawled {url}. Content length: {len(result['markdown_content'])} characters.\n\n"
             response_text += f"Full content:\n{result['markdown_content']}"
@@ -248,79 +689,515 @@ Remember to always prioritize software quality and user experience in your respo
         except Exception as e:
             return f"Error crawling website {url}: {str(e)}"
     
+    async def crawl_for_run(self, run: QARunContext, url: str) -> Dict[str, Any]:
+        """Crawl through the suite's shared crawls when the run belongs to a suite."""
+        if run.shared_crawls is not None:
+            return await run.shared_crawls.get(url, self.fetch_crawl)
+        return await self.fetch_crawl(url)
+    
+    def start_prefetch(self, run: QARunContext, user_input: str):
+        """Start crawling the URLs of the prompt while the agent plans its tool calls."""
+        if not self.prefetch_enabled:
+            return
+        for url in extract_urls(user_input)[:self.prefetch_max_urls]:
+            print(f"[debug-client] Prefetching crawl of {url}")
+            run.prefetched[url_key(url)] = asyncio.ensure_future(self.crawl_for_run(run, url))
+        self.prefetch_stats["started"] += len(run.prefetched)
+    
+    def finish_prefetch(self, run: QARunContext) -> Dict[str, Any]:
+        """Cancel the prefetches the agent never used and record them as wasted."""
+        wasted = [key for key in run.prefetched if key not in run.prefetch_used]
+        cancelled = 0
+        for key in wasted:
+            task = run.prefetched[key]
+            if not task.done():
+                task.cancel()
+                cancelled += 1
+            elif not task.cancelled():
+                task.exception()  # Retrieve the error of an unused failed prefetch
+        if wasted:
+            print(f"[debug-client] Wasted prefetches: {', '.join(wasted)}")
+        self.prefetch_stats["used"] += len(run.prefetch_used)
+        self.prefetch_stats["wasted"] += len(wasted)
+        self.prefetch_stats["wasted_in_flight"] += cancelled
+        return {"started": len(run.prefetched), "used": len(run.prefetch_used), "wasted": len(wasted)}
+    
+    async def fetch_crawl(self, url: str) -> Dict[str, Any]:
+        """Call the server /crawl endpoint."""
+        # Crawling is read-only, so it is safe to retry
+        return await self.transport.post("/crawl", {"url": url}, idempotent=True)
+    
     # browser agent function for tool
-    def browser_agent(self, prompt: str) -> str:
+    async def browser_agent(self, prompt: str) -> str:
         """Run a browser automation agent to test user flows and interactions."""
         try:
             print(f"[debug-client] browser_agent({prompt})")
             print(f"[debug-client] Connecting to server at: {self.server_url}")
-            response = requests.post(
-                f"{self.server_url}/browser-agent",
-                json={"prompt": prompt},
-                headers={"x-api-key": self.qa_api_key}
-            )
-            response.raise_for_status()
-            result = response.json()
+            # Browser flows can submit forms or place orders, so they are never retried
+            # (nor repeated when the run escalates to a stronger model)
+            run = current_run.get()
+            if prompt in run.browser_results:
+                return run.browser_results[prompt]
+            start = time.perf_counter()
+            result = await self.transport.post("/browser-agent", {"prompt": prompt})
+            run.record_tool_call("browser_agent", prompt, start)
             
             response_text = f"Browser agent completed task: {prompt}\n\n"
             response_text += f"Result: {result['result']}"
             
-            # Store model_actions and screenshots for later use in process_request
-            self.last_browser_model_actions = result.get('model_actions')
-            self.last_browser_screenshots = result.get('screenshots')
+            # Store model_actions and screenshots in the current run for process_request
+            if result.get('model_actions'):
+                run.browser_model_actions.append(result['model_actions'])
+            if result.get('screenshots'):
+                run.browser_screenshots.append(result['screenshots'])
             
+            run.browser_results[prompt] = response_text
             return response_text
         except Exception as e:
-            # Reset model_actions and screenshots on error
-            self.last_browser_model_actions = None
-            self.last_browser_screenshots = None
             return f"Error running browser agent: {str(e)}"
     
     # process request function 
-    def process_request(self, user_input: str) -> Dict[str, Any]:
+    async def process_request(self, user_input: str, shared_crawls: SharedCrawls | None = None) -> Dict[str, Any]:
         """Process a user request using the QA agent and return JSON with status and console_log."""
-        # Reset browser agent results for new request
-        self.last_browser_model_actions = None
-        self.last_browser_screenshots = None
-        
-        # Create a custom agent executor that limits to one tool use
-        single_tool_executor = AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            verbose=True,
-            max_iterations=2  # Allow one tool use + final response
-        )
-        
-        # Process the request without chat history (stateless)
-        result = single_tool_executor.invoke({
-            "input": user_input
-        })
+        # Fresh run context for this request; the tools write their side outputs into it.
+        # Crawls are always shared inside the run so an escalated tier reuses them.
+        run = QARunContext(shared_crawls or SharedCrawls())
+        token = current_run.set(run)
+        self.start_prefetch(run, user_input)
         
-        # Get the agent's response
-        agent_response = result["output"]
+        # Process the request without chat history (stateless), escalating through the cascade
+        cascade = []
+        try:
+            for tier, (model, agent) in enumerate(zip(self.cascade_models, self.agents)):
+                # Create a custom agent executor that limits to one round of tool calls; all the tool
+                # calls of that round are executed concurrently by the async executor
+                single_round_executor = AgentExecutor(
+                    agent=agent,
+                    tools=self.tools,
+                    verbose=True,
+                    max_iterations=2  # Allow one round of tool calls + final response
+                )
+                tokens_before = dict(run.tokens)
+                start = time.perf_counter()
+                result = await single_round_executor.ainvoke(
+                    {"input": user_input},
+                    config={"callbacks": [TokenUsageCallback(run)]}
+                )
+                latency = time.perf_counter() - start
+                
+                verdict, confidence, console_log = parse_verdict(result["output"])
+                reason = None
+                if verdict is None:
+                    reason = "no_verdict"
+                elif CONFIDENCE_LEVELS[confidence] < CONFIDENCE_LEVELS[self.min_confidence]:
+                    reason = "low_confidence"
+                escalated = reason is not None and tier < len(self.cascade_models) - 1
+                
+                tokens = {key: run.tokens[key] - tokens_before[key] for key in run.tokens}
+                cost = token_cost(model, tokens)
+                cascade.append({
+                    "model": model,
+                    "verdict": verdict,
+                    "confidence": confidence,
+                    "latency_seconds": round(latency, 3),
+                    "tokens": tokens,
+                    "cost_usd": cost,
+                    "escalated": escalated,
+                    "escalation_reason": reason if escalated else None
+                })
+                stats = self.cascade_stats[model]
+                stats["runs"] += 1
+                stats["escalations"] += int(escalated)
+                stats["latency_seconds"] += latency
+                stats["cost_usd"] += cost or 0.0
+                if not escalated:
+                    break
+                print(f"[debug-client] Escalating from {model} ({reason})")
+        finally:
+            current_run.reset(token)
+            prefetch = self.finish_prefetch(run)
         
-        # Simple status determination
-        if "BUG_DETECTED:" in agent_response:
-            status = "failed"
-            console_log = agent_response.replace("BUG_DETECTED:", "").strip()
-        elif "PASSED:" in agent_response:
-            status = "passed"
-            console_log = agent_response.replace("PASSED:", "").strip()
-        else:
-            status = "passed"
-            console_log = agent_response
+        # Simple status determination (an answer without a verdict counts as passed)
+        status = verdict or "passed"
         
         # Return JSON with status, console_log, model_actions, and screenshots
         return {
             "status": status,
             "console_logs": console_log,
-            "model_actions": self.last_browser_model_actions,
-            "screenshots": self.last_browser_screenshots
+            "model_actions": QARunContext.merge_outputs(run.browser_model_actions),
+            "screenshots": QARunContext.merge_outputs(run.browser_screenshots),
+            "tokens": run.tokens,
+            "llm_cache": {**run.llm_cache, "hit_rate": hit_rate(run.llm_cache)},
+            "tool_calls": run.tool_calls,
+            "prefetch": prefetch,
+            "cascade": cascade
         }
 
+    async def close(self):
+        """Close the shared server transport."""
+        await self.transport.close()
+
 # Global QA Agent instance
 qa_agent = None
 
+QA_SUITE_CONCURRENCY = int(os.getenv("QA_SUITE_CONCURRENCY", "4"))
+
+def parse_suite(text: str, suite_format: str) -> tuple:
+    """
+    Parse a QA suite and return (name, cases). YAML suites are either a list of cases or a
+    mapping with "name" and "cases"; JSONL suites have one case per line. Every case needs a
+    "prompt" and may set "id" and "expected_status" ("passed" or "failed").
+    """
+    name = None
+    if suite_format == "yaml":
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("pyyaml is required to read YAML suites")
+        data = yaml.safe_load(text) or []
+        if isinstance(data, dict):
+            name = data.get("name")
+            data = data.get("cases") or []
+        cases = data
+    else:
+        cases = [json.loads(line) for line in text.splitlines() if line.strip()]
+    
+    for i, case in enumerate(cases):
+        if not isinstance(case, dict) or not case.get("prompt"):
+            raise ValueError(f"Suite case {i + 1} has no prompt")
+        case.setdefault("id", f"case-{i + 1}")
+    return name, cases
+
+def load_suite(path: str) -> tuple:
+    """Read a suite file; the format comes from the extension (.yaml/.yml or .jsonl)."""
+    suite_format = "jsonl" if path.endswith(".jsonl") else "yaml"
+    with open(path, encoding="utf-8") as f:
+        name, cases = parse_suite(f.read(), suite_format)
+    return name or os.path.splitext(os.path.basename(path))[0], cases
+
+async def run_suite_case(agent: QAAgent, case: Dict[str, Any], semaphore: asyncio.Semaphore,
+                         shared_crawls: SharedCrawls) -> Dict[str, Any]:
+    """Run one suite case and classify it as passed, failed or error."""
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            result = await agent.process_request(case["prompt"], shared_crawls)
+            error = None
+        except Exception as e:
+            result = {"status": None, "console_logs": "", "tokens": None, "llm_cache": None}
+            error = str(e)
+        latency = time.perf_counter() - start
+    
+    expected = case.get("expected_status", "passed")
+    if error is not None:
+        outcome = "error"
+    else:
+        outcome = "passed" if result["status"] == expected else "failed"
+    print(f"[debug-client] Suite case {case['id']}: {outcome} in {latency:.2f}s")
+    return {
+        "id": case["id"],
+        "prompt": case["prompt"],
+        "expected_status": expected,
+        "status": result["status"],
+        "outcome": outcome,
+        "latency_seconds": round(latency, 3),
+        "tokens": result["tokens"],
+        "llm_cache": result["llm_cache"],
+        "console_logs": result["console_logs"],
+        "error": error
+    }
+
+async def run_suite(agent: QAAgent, name: str, cases: List[Dict[str, Any]], concurrency: int | None = None) -> Dict[str, Any]:
+    """
+    Run all cases concurrently (at most `concurrency` at a time) sharing crawls between cases,
+    and return a JSON summary with per-case latency, tokens and outcome.
+    """
+    concurrency = concurrency or QA_SUITE_CONCURRENCY
+    semaphore = asyncio.Semaphore(concurrency)
+    shared_crawls = SharedCrawls()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_suite_case(agent, case, semaphore, shared_crawls) for case in cases))
+    wall_time = time.perf_counter() - start
+    
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    llm_cache = {"hits": 0, "misses": 0}
+    for result in results:
+        for key in totals:
+            totals[key] += (result["tokens"] or {}).get(key, 0)
+        for key in llm_cache:
+            llm_cache[key] += (result["llm_cache"] or {}).get(key, 0)
+    latencies = sorted(result["latency_seconds"] for result in results)
+    return {
+        "name": name,
+        "total": len(results),
+        "passed": sum(1 for result in results if result["outcome"] == "passed"),
+        "failed": sum(1 for result in results if result["outcome"] == "failed"),
+        "errors": sum(1 for result in results if result["outcome"] == "error"),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_time, 3),
+        "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+        "latency_max": latencies[-1] if latencies else None,
+        "tokens": totals,
+        "llm_cache": {**llm_cache, "hit_rate": hit_rate(llm_cache)},
+        "crawls": shared_crawls.stats(),
+        "cases": results
+    }
+
+def suite_to_junit_xml(summary: Dict[str, Any]) -> str:
+    """Render a suite summary as JUnit XML (one testcase per QA case)."""
+    testsuite = ET.Element("testsuite", {
+        "name": summary["name"],
+        "tests": str(summary["total"]),
+        "failures": str(summary["failed"]),
+        "errors": str(summary["errors"]),
+        "time": str(summary["wall_seconds"])
+    })
+    for case in summary["cases"]:
+        testcase = ET.SubElement(testsuite, "testcase", {
+            "classname": summary["name"],
+            "name": str(case["id"]),
+            "time": str(case["latency_seconds"])
+        })
+        if case["outcome"] == "failed":
+            failure = ET.SubElement(testcase, "failure", {
+                "message": f"expected {case['expected_status']}, got {case['status']}"
+            })
+            failure.text = case["console_logs"]
+        elif case["outcome"] == "error":
+            error = ET.SubElement(testcase, "error", {"message": case["error"]})
+            error.text = case["error"]
+        system_out = ET.SubElement(testcase, "system-out")
+        system_out.text = case["console_logs"]
+    return ET.tostring(testsuite, encoding="unicode", xml_declaration=True)
+
+class MonitorRequest(BaseModel):
+    name: str
+    prompt: str
+    # Pages fingerprinted before each run; by default the URLs found in the prompt
+    urls: List[str] = []
+    interval_seconds: int = 3600
+
+class MonitorStore:
+    """SQLite storage of monitored prompt/URL pairs and the history of their checks."""
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS monitors (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    prompt TEXT NOT NULL,
+                    urls TEXT NOT NULL,
+                    interval_seconds INTEGER NOT NULL,
+                    enabled INTEGER NOT NULL DEFAULT 1,
+                    validators TEXT NOT NULL DEFAULT '{}',
+                    fingerprint TEXT,
+                    last_status TEXT,
+                    last_checked_at REAL,
+                    next_run_at REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS monitor_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    monitor_id TEXT NOT NULL,
+                    checked_at REAL NOT NULL,
+                    changed INTEGER NOT NULL,
+                    evaluated INTEGER NOT NULL,
+                    fingerprint TEXT,
+                    status TEXT,
+                    console_logs TEXT,
+                    latency_seconds REAL,
+                    tokens TEXT,
+                    error TEXT
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS monitor_runs_monitor ON monitor_runs (monitor_id, checked_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _monitor(row: sqlite3.Row) -> Dict[str, Any]:
+        monitor = dict(row)
+        monitor["urls"] = json.loads(monitor["urls"])
+        monitor["validators"] = json.loads(monitor["validators"])
+        monitor["enabled"] = bool(monitor["enabled"])
+        return monitor
+
+    def create(self, request: MonitorRequest) -> str:
+        monitor_id = uuid.uuid4().hex
+        urls = request.urls or extract_urls(request.prompt)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO monitors (id, name, prompt, urls, interval_seconds, next_run_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (monitor_id, request.name, request.prompt, json.dumps(urls), request.interval_seconds, now, now)
+            )
+        return monitor_id
+
+    def get(self, monitor_id: str) -> Dict[str, Any] | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM monitors WHERE id = ?", (monitor_id,)).fetchone()
+        return self._monitor(row) if row else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM monitors ORDER BY created_at").fetchall()
+        return [self._monitor(row) for row in rows]
+
+    def due(self, now: float) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM monitors WHERE enabled = 1 AND next_run_at <= ? ORDER BY next_run_at", (now,)
+            ).fetchall()
+        return [self._monitor(row) for row in rows]
+
+    def delete(self, monitor_id: str) -> bool:
+        with self._connect() as conn:
+            deleted = conn.execute("DELETE FROM monitors WHERE id = ?", (monitor_id,)).rowcount
+            conn.execute("DELETE FROM monitor_runs WHERE monitor_id = ?", (monitor_id,))
+        return deleted > 0
+
+    def record_check(self, monitor: Dict[str, Any], check: Dict[str, Any], validators: Dict[str, Any]):
+        """Store a check in the history and schedule the next one."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO monitor_runs (monitor_id, checked_at, changed, evaluated, fingerprint, status, "
+                "console_logs, latency_seconds, tokens, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (monitor["id"], check["checked_at"], int(check["changed"]), int(check["evaluated"]),
+                 check["fingerprint"], check["status"], check["console_logs"], check["latency_seconds"],
+                 json.dumps(check["tokens"]) if check["tokens"] else None, check["error"])
+            )
+            conn.execute(
+                "UPDATE monitors SET validators = ?, fingerprint = ?, last_status = ?, last_checked_at = ?, "
+                "next_run_at = ? WHERE id = ?",
+                (json.dumps(validators), check["fingerprint"], check["status"], check["checked_at"],
+                 check["checked_at"] + monitor["interval_seconds"], monitor["id"])
+            )
+
+    def history(self, monitor_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM monitor_runs WHERE monitor_id = ? ORDER BY checked_at DESC LIMIT ?",
+                (monitor_id, limit)
+            ).fetchall()
+        history = []
+        for row in rows:
+            run = dict(row)
+            run["changed"] = bool(run["changed"])
+            run["evaluated"] = bool(run["evaluated"])
+            run["tokens"] = json.loads(run["tokens"]) if run["tokens"] else None
+            history.append(run)
+        return history
+
+class MonitorScheduler:
+    """
+    Runs the monitors that are due. Each check first fingerprints the monitored pages with
+    conditional GETs (ETag/Last-Modified) and a hash of the visible HTML; the full QA
+    evaluation only runs when the fingerprint changed (or there is no verdict yet).
+    """
+    SCRIPT_STYLE_RE = re.compile(r"<(script|style|noscript)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+    TAG_RE = re.compile(r"<[^>]+>")
+
+    def __init__(self, store: MonitorStore):
+        self.store = store
+        self.tick_seconds = float(os.getenv("MONITOR_TICK_SECONDS", "30"))
+        self.semaphore = asyncio.Semaphore(int(os.getenv("MONITOR_CONCURRENCY", "2")))
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(15.0), follow_redirects=True)
+        self.running: Dict[str, asyncio.Task] = {}
+        self.task: asyncio.Task | None = None
+
+    def page_hash(self, html: str) -> str:
+        # Only the visible text: scripts, styles and markup carry nonces and build hashes
+        text = self.TAG_RE.sub(" ", self.SCRIPT_STYLE_RE.sub(" ", html))
+        return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+    async def fingerprint(self, urls: List[str], validators: Dict[str, Any]) -> tuple:
+        """Return (fingerprint, validators) of the pages; unchanged pages answer 304 and reuse their hash."""
+        async def page(url: str) -> tuple:
+            previous = validators.get(url) or {}
+            headers = {}
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+            try:
+                response = await self.client.get(url, headers=headers)
+                if response.status_code == 304 and previous.get("hash"):
+                    return url, previous
+                content_hash = self.page_hash(response.text) if response.status_code < 400 else f"http-{response.status_code}"
+                return url, {
+                    "etag": response.headers.get("etag"),
+                    "last_modified": response.headers.get("last-modified"),
+                    "hash": content_hash
+                }
+            except httpx.HTTPError as e:
+                return url, {"hash": f"error-{type(e).__name__}"}
+        
+        pages = dict(await asyncio.gather(*(page(url) for url in urls)))
+        combined = "\n".join(f"{url} {pages[url]['hash']}" for url in sorted(pages))
+        return hashlib.sha256(combined.encode("utf-8")).hexdigest(), pages
+
+    async def check(self, monitor: Dict[str, Any], force: bool = False) -> Dict[str, Any]:
+        """Fingerprint the monitor's pages and run the QA evaluation if they changed."""
+        async with self.semaphore:
+            checked_at = time.time()
+            fingerprint, validators = await self.fingerprint(monitor["urls"], monitor["validators"])
+            changed = fingerprint != monitor["fingerprint"]
+            check = {
+                "checked_at": checked_at, "changed": changed, "evaluated": False, "fingerprint": fingerprint,
+                "status": monitor["last_status"], "console_logs": None, "latency_seconds": None,
+                "tokens": None, "error": None
+            }
+            if changed or force or not monitor["urls"] or monitor["last_status"] in (None, "error"):
+                start = time.perf_counter()
+                try:
+                    result = await qa_agent.process_request(monitor["prompt"])
+                    check.update(status=result["status"], console_logs=result["console_logs"], tokens=result["tokens"])
+                except Exception as e:
+                    check.update(status="error", error=str(e))
+                check.update(evaluated=True, latency_seconds=round(time.perf_counter() - start, 3))
+            print(f"[debug-client] Monitor {monitor['name']}: changed={changed}, evaluated={check['evaluated']}, "
+                  f"status={check['status']}")
+            await asyncio.to_thread(self.store.record_check, monitor, check, validators)
+            return check
+
+    def start_check(self, monitor: Dict[str, Any], force: bool = False) -> asyncio.Task:
+        """Start a check unless one is already running for the monitor."""
+        task = self.running.get(monitor["id"])
+        if task is None:
+            task = asyncio.create_task(self.check(monitor, force))
+            self.running[monitor["id"]] = task
+            task.add_done_callback(lambda _: self.running.pop(monitor["id"], None))
+        return task
+
+    async def loop(self):
+        while True:
+            try:
+                for monitor in await asyncio.to_thread(self.store.due, time.time()):
+                    self.start_check(monitor)
+            except Exception as e:
+                print(f"[debug-client] Monitor scheduler error: {str(e)}")
+            await asyncio.sleep(self.tick_seconds)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+        for task in list(self.running.values()):
+            task.cancel()
+        await self.client.aclose()
+
+monitor_store = MonitorStore(os.getenv("MONITOR_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "qa_monitors.db")))
+monitor_scheduler = MonitorScheduler(monitor_store)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize the QA Agent on startup."""
@@ -330,11 +1207,21 @@ async def startup_event():
         print("=== QA Quality Assurance API Initialized ===")
         print("Available tools: crawl_website, browser_agent")
         print(f"API Key authentication enabled")
-        print(f"Server URL: {qa_agent.server_url}")
+        print(f"Server URL: {qa_agent.server_url} (transport: {qa_agent.transport.stats()['transport']})")
+        if os.getenv("MONITOR_SCHEDULER_ENABLED", "true").lower() == "true":
+            monitor_scheduler.start()
+            print("Monitor scheduler started")
     except Exception as e:
         print(f"Error initializing QA Agent: {str(e)}")
         raise e
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the monitor scheduler and close the QA Agent HTTP client on shutdown."""
+    await monitor_scheduler.stop()
+    if qa_agent is not None:
+        await qa_agent.close()
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -344,6 +1231,14 @@ async def root():
         "authentication": "API Key required (X-API-Key header)",
         "endpoints": {
             "/process-prompt": "POST - Process a QA prompt and return results (requires API key)",
+            "/run-suite": "POST - Run a YAML/JSONL QA suite concurrently and return JSON + JUnit XML reports (requires API key)",
+            "/transport-stats": "GET - Statistics of the QA server transport (requires API key)",
+            "/llm-cache-stats": "GET - Hit rate and size of the LLM response cache (requires API key)",
+            "/cascade-stats": "GET - Per-model latency, cost and escalation rate of the model cascade (requires API key)",
+            "/prefetch-stats": "GET - Used and wasted speculative crawl prefetches (requires API key)",
+            "/monitors": "POST/GET - Create or list scheduled QA monitors (requires API key)",
+            "/monitors/{monitor_id}": "GET/DELETE - Monitor with its verdict history, or delete it (requires API key)",
+            "/monitors/{monitor_id}/run": "POST - Check a monitor now; force=true always runs the QA evaluation (requires API key)",
             "/health": "GET - Health check endpoint"
         }
     }
@@ -353,6 +1248,116 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "qa_agent_initialized": qa_agent is not None}
 
+@app.get("/transport-stats")
+async def transport_stats(api_key: str = Depends(verify_api_key)):
+    """Connection reuse statistics of the pooled transport to the QA server."""
+    if qa_agent is None:
+        raise HTTPException(status_code=500, detail="QA Agent not initialized")
+    return qa_agent.transport.stats()
+
+@app.get("/prefetch-stats")
+async def prefetch_stats(api_key: str = Depends(verify_api_key)):
+    """Speculative crawl prefetch counters since startup, to tune the URL heuristic."""
+    if qa_agent is None:
+        raise HTTPException(status_code=500, detail="QA Agent not initialized")
+    stats = qa_agent.prefetch_stats
+    return {
+        "enabled": qa_agent.prefetch_enabled,
+        **stats,
+        "waste_rate": round(stats["wasted"] / stats["started"], 3) if stats["started"] else None
+    }
+
+@app.get("/cascade-stats")
+async def cascade_stats(api_key: str = Depends(verify_api_key)):
+    """Runs, escalation rate, average latency and cost per model tier since startup."""
+    if qa_agent is None:
+        raise HTTPException(status_code=500, detail="QA Agent not initialized")
+    tiers = []
+    for model in qa_agent.cascade_models:
+        stats = qa_agent.cascade_stats[model]
+        runs = stats["runs"]
+        tiers.append({
+            "model": model,
+            "runs": runs,
+            "escalations": stats["escalations"],
+            "escalation_rate": round(stats["escalations"] / runs, 3) if runs else None,
+            "avg_latency_seconds": round(stats["latency_seconds"] / runs, 3) if runs else None,
+            "cost_usd": round(stats["cost_usd"], 6),
+            "avg_cost_usd": round(stats["cost_usd"] / runs, 6) if runs else None
+        })
+    return {"min_confidence": qa_agent.min_confidence, "tiers": tiers}
+
+@app.get("/llm-cache-stats")
+async def llm_cache_stats(api_key: str = Depends(verify_api_key)):
+    """Hit rate and size of the LLM response cache since startup."""
+    if qa_agent is None:
+        raise HTTPException(status_code=500, detail="QA Agent not initialized")
+    if qa_agent.llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(qa_agent.llm_cache.stats)}
+
+@app.post("/run-suite")
+async def run_suite_endpoint(
+    request: SuiteRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """Run a QA suite concurrently and return the JSON summary and the JUnit XML report."""
+    if qa_agent is None:
+        raise HTTPException(status_code=500, detail="QA Agent not initialized")
+    
+    try:
+        name, cases = parse_suite(request.suite, request.format)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid suite: {str(e)}")
+    
+    try:
+        summary = await run_suite(qa_agent, request.name or name or "qa-suite", cases, request.concurrency)
+        return {"summary": summary, "junit_xml": suite_to_junit_xml(summary)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running suite: {str(e)}")
+
+@app.post("/monitors")
+async def create_monitor(
+    request: MonitorRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """Create a monitored prompt/URL pair; its first check runs on the next scheduler tick."""
+    if request.interval_seconds < 60:
+        raise HTTPException(status_code=400, detail="interval_seconds must be at least 60")
+    monitor_id = await asyncio.to_thread(monitor_store.create, request)
+    return await asyncio.to_thread(monitor_store.get, monitor_id)
+
+@app.get("/monitors")
+async def list_monitors(api_key: str = Depends(verify_api_key)):
+    """List the monitors with their last verdict."""
+    return {"monitors": await asyncio.to_thread(monitor_store.list)}
+
+@app.get("/monitors/{monitor_id}")
+async def get_monitor(monitor_id: str, limit: int = 50, api_key: str = Depends(verify_api_key)):
+    """Return a monitor and the history of its checks (newest first)."""
+    monitor = await asyncio.to_thread(monitor_store.get, monitor_id)
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Monitor not found")
+    monitor["history"] = await asyncio.to_thread(monitor_store.history, monitor_id, limit)
+    return monitor
+
+@app.delete("/monitors/{monitor_id}")
+async def delete_monitor(monitor_id: str, api_key: str = Depends(verify_api_key)):
+    """Delete a monitor and its history."""
+    if not await asyncio.to_thread(monitor_store.delete, monitor_id):
+        raise HTTPException(status_code=404, detail="Monitor not found")
+    return {"deleted": monitor_id}
+
+@app.post("/monitors/{monitor_id}/run")
+async def run_monitor(monitor_id: str, force: bool = False, api_key: str = Depends(verify_api_key)):
+    """Check a monitor now and return the result of the check."""
+    if qa_agent is None:
+        raise HTTPException(status_code=500, detail="QA Agent not initialized")
+    monitor = await asyncio.to_thread(monitor_store.get, monitor_id)
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Monitor not found")
+    return await asyncio.shield(monitor_scheduler.start_check(monitor, force))
+
 @app.post("/process-prompt", response_model=PromptResponse)
 async def process_prompt(
     request: PromptRequest,
@@ -363,7 +1368,7 @@ async def process_prompt(
         raise HTTPException(status_code=500, detail="QA Agent not initialized")
     
     try:
-        result = qa_agent.process_request(request.prompt)
+        result = await qa_agent.process_request(request.prompt)
         return PromptResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing prompt: {str(e)}")
@@ -380,11 +1385,44 @@ def main():
     print(f"  - GET  http://{host}:{port}/ (API info)")
     print(f"  - GET  http://{host}:{port}/health (Health check)")
     print(f"  - POST http://{host}:{port}/process-prompt (Process QA prompt - requires API key)")
+    print(f"  - GET  http://{host}:{port}/transport-stats (Server connection stats - requires API key)")
     print(f"\nAPI Key authentication enabled")
     print("Use X-API-Key header with your QA_API_KEY_CLIENT value")
     print("\nPress Ctrl+C to stop the server\n")
     
     uvicorn.run(app, host=host, port=port)
 
+async def run_suite_from_file(args: argparse.Namespace) -> Dict[str, Any]:
+    agent = QAAgent()
+    try:
+        name, cases = load_suite(args.suite)
+        summary = await run_suite(agent, name, cases, args.concurrency)
+    finally:
+        await agent.close()
+    with open(args.junit, "w", encoding="utf-8") as f:
+        f.write(suite_to_junit_xml(summary))
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    return summary
+
+def run_suite_cli(argv: List[str]):
+    """Run a QA suite from the command line: python main.py run-suite suite.yaml"""
+    parser = argparse.ArgumentParser(prog="main.py run-suite", description="Run a QA suite concurrently")
+    parser.add_argument("suite", help="Suite file (.yaml/.yml or .jsonl)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Maximum cases running at once")
+    parser.add_argument("--junit", default="qa_suite_junit.xml", help="JUnit XML report path")
+    parser.add_argument("--json", default="qa_suite_summary.json", help="JSON summary path")
+    args = parser.parse_args(argv)
+    
+    summary = asyncio.run(run_suite_from_file(args))
+    print(f"\n=== Suite {summary['name']}: {summary['passed']} passed, {summary['failed']} failed, "
+          f"{summary['errors']} errors in {summary['wall_seconds']}s ===")
+    print(f"JUnit report: {args.junit}")
+    print(f"JSON summary: {args.json}")
+    sys.exit(0 if summary["failed"] == 0 and summary["errors"] == 0 else 1)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "run-suite":
+        run_suite_cli(sys.argv[2:])
+    else:
+        main()
\ No newline at end of file
@@ -1,18 +1,32 @@
 from fastapi import FastAPI, HTTPException, Request, status, Depends
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
 from crawl4ai import AsyncWebCrawler
 from langchain_openai import ChatOpenAI
 from browser_use import Agent, BrowserConfig, Browser
 from dotenv import load_dotenv
-from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
 from urllib.parse import urlparse, parse_qs
 import uvicorn
 import os
 import asyncio
 import json
+import functools
+import hashlib
 import re
-from typing import List, Dict, Any
+import sqlite3
+import threading
+import string
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Literal
+from langchain_core.runnables import Runnable
 import requests
+import httpx
 
 load_dotenv()
 
@@ -22,6 +36,18 @@ app = FastAPI(title="Quality Assurance Agent Server", version="1.0.0")
 crawler = None
 crawler_lock = asyncio.Lock()
 
+# Bounded thread pool for blocking I/O (YouTube transcript API, title scraping, SQLite)
+# so it never runs on the event loop
+io_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IO_THREAD_POOL_SIZE", 8)),
+    thread_name_prefix="server-io"
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking function in the I/O thread pool without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(func, *args, **kwargs))
+
 API_KEY = os.getenv("QA_API_KEY")
 if not API_KEY:
     raise RuntimeError("QA_API_KEY not set in environment variables")
@@ -50,6 +76,7 @@ class BrowserAgentResponse(BaseModel):
 class YouTubeTranscriptRequest(BaseModel):
     url: str
     translate_code: str
+    language: str = "en"
 
 class YouTubeTranscriptResponse(BaseModel):
     transcript: list
@@ -60,10 +87,70 @@ class YouTubeTranscriptResponse(BaseModel):
 class ProcessTranscriptRequest(BaseModel):
     url: str
     prompt: str
+    target_language: str = "es"
+    # "statements": un INSERT por fila; "bulk": una sola cadena de CTEs con INSERT multi-fila;
+    # "diff": solo UPDATE/INSERT/DELETE de lo que cambió respecto de la última versión generada
+    sql_format: Literal["statements", "bulk", "diff"] = "statements"
+    # Cargar la lección directamente en LESSONS_DATABASE_URL además de devolver el SQL
+    write_to_database: bool = False
+    # Ignorar el resultado guardado en caché y volver a procesar el video
+    force_refresh: bool = False
+
+class ProcessTranscriptStreamRequest(BaseModel):
+    # El streaming siempre emite SQL por sentencias y no usa la caché ni la carga directa:
+    # se rechazan sql_format, write_to_database o force_refresh en lugar de ignorarlos
+    model_config = ConfigDict(extra="forbid")
+    url: str
+    prompt: str
+    target_language: str = "es"
+
+class BatchJobRequest(BaseModel):
+    urls: List[str] = []
+    playlist_id: str | None = None
+    prompt: str
+    target_language: str = "es"
+    sql_format: Literal["statements", "bulk", "diff"] = "statements"
+    write_to_database: bool = False
+    force_refresh: bool = False
 
 class ProcessTranscriptResponse(BaseModel):
     sql_inserts: str
     processed_data: dict
+    stats: dict = {}
+
+# Esquema de la respuesta de traducción de la IA (formato compacto con claves cortas).
+# Todos los campos son obligatorios y sin propiedades extra para usar structured output estricto.
+class TranslatedVocabulary(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    w: str
+    tr: str
+    n: str | None
+
+class TranslatedClip(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    i: int
+    t: str
+    v: List[TranslatedVocabulary]
+
+    @field_validator("t")
+    @classmethod
+    def translation_not_empty(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("empty translation")
+        return value
+
+    def to_translation(self) -> Dict[str, Any]:
+        return {
+            "text_translate": self.t,
+            "vocabulary": [
+                {"original_word": vocab.w, "translation": vocab.tr, "notes": vocab.n or None}
+                for vocab in self.v
+            ]
+        }
+
+class TranslatedClips(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    c: List[TranslatedClip]
 
 async def get_crawler():
     """Get or create the global crawler instance"""
@@ -74,61 +161,438 @@ async def get_crawler():
             await crawler.start()
         return crawler
 
-def get_youtube_video_title(video_id: str) -> str:
+# Base de datos SQLite local compartida por las cachés del servidor
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_cache.db"))
+
+def get_cache_connection() -> sqlite3.Connection:
     """
-    Obtiene el título real del video de YouTube
+    Abre una conexión a la base de datos SQLite de cachés del servidor
     """
-    try:
-        # Intentar obtener el título usando la API pública de YouTube
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    conn = sqlite3.connect(CACHE_DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+class TranscriptCache:
+    """
+    Caché persistente de transcripciones de YouTube por video_id e idioma.
+    Guarda también los videos sin transcripción disponible (caché negativa)
+    para no repetir la consulta en cada intento.
+    """
+    def __init__(self, ttl: int, negative_ttl: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        with get_cache_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcript_cache (
+                    video_id TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    language_code TEXT,
+                    data TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, language)
+                )""")
+
+    def get(self, video_id: str, language: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve la entrada vigente o None si no existe o expiró
+        """
+        with get_cache_connection() as conn:
+            row = conn.execute(
+                "SELECT language_code, data, error, created_at FROM transcript_cache WHERE video_id = ? AND language = ?",
+                (video_id, language)
+            ).fetchone()
+        if row is None:
+            return None
+        language_code, data, error, created_at = row
+        ttl = self.negative_ttl if error is not None else self.ttl
+        if time.time() - created_at > ttl:
+            return None
+        return {
+            "language_code": language_code,
+            "data": json.loads(data) if data is not None else None,
+            "error": error
         }
-        
-        response = requests.get(url, headers=headers, timeout=15)
-        if response.status_code == 200:
-            # Buscar el título en el HTML de la página
-            html_content = response.text
-            
-            # Buscar el título en diferentes patrones comunes
-            title_patterns = [
-                r'<title>(.*?)</title>',
-                r'"title":"([^"]+)"',
-                r'<meta property="og:title" content="([^"]+)"',
-                r'<meta name="title" content="([^"]+)"',
-                r'"videoTitle":"([^"]+)"',
-                r'"title":"([^"]+)"'
-            ]
-            
-            for pattern in title_patterns:
-                match = re.search(pattern, html_content)
-                if match:
-                    title = match.group(1)
-                    # Limpiar el título
-                    title = title.replace(' - YouTube', '').replace(' | YouTube', '')
-                    title = title.replace('&amp;', '&').replace('&quot;', '"').replace('&#39;', "'")
-                    title = title.strip()
-                    if title and len(title) > 5:  # Verificar que el título sea válido
-                        # Limitar la longitud del título para la base de datos
-                        if len(title) > 200:
-                            title = title[:197] + "..."
-                        return title
-            
-            # Si no se encuentra con los patrones, usar un título por defecto
-            return f"Video {video_id}"
-        else:
-            print(f"Error HTTP {response.status_code} al obtener título del video")
-            return f"Video {video_id}"
-            
-    except requests.exceptions.Timeout:
-        print(f"Timeout al obtener título del video {video_id}")
-        return f"Video {video_id}"
-    except requests.exceptions.RequestException as e:
-        print(f"Error de conexión al obtener título del video: {str(e)}")
-        return f"Video {video_id}"
-    except Exception as e:
-        print(f"Error inesperado obteniendo título del video: {str(e)}")
+
+    def set(self, video_id: str, language: str, language_code: str, data: List[Dict]):
+        with get_cache_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO transcript_cache (video_id, language, language_code, data, error, created_at) VALUES (?, ?, ?, ?, NULL, ?)",
+                (video_id, language, language_code, json.dumps(data, ensure_ascii=False), time.time())
+            )
+
+    def set_missing(self, video_id: str, language: str, error: str):
+        with get_cache_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO transcript_cache (video_id, language, language_code, data, error, created_at) VALUES (?, ?, NULL, NULL, ?, ?)",
+                (video_id, language, error, time.time())
+            )
+
+    def invalidate(self, video_id: str):
+        with get_cache_connection() as conn:
+            conn.execute("DELETE FROM transcript_cache WHERE video_id = ?", (video_id,))
+
+transcript_cache = TranscriptCache(
+    ttl=int(os.getenv("TRANSCRIPT_CACHE_TTL", 7 * 24 * 3600)),
+    negative_ttl=int(os.getenv("TRANSCRIPT_CACHE_NEGATIVE_TTL", 6 * 3600))
+)
+
+# Modelo usado para procesar transcripciones
+TRANSCRIPT_MODEL = os.getenv("TRANSCRIPT_MODEL", "gpt-4o")
+# Modelo de OpenAI que maneja el navegador en /browser-agent
+BROWSER_AGENT_MODEL = os.getenv("BROWSER_AGENT_MODEL", "gpt-4o")
+
+class ProcessedResultCache:
+    """
+    Caché persistente de resultados de /process-transcript (datos procesados, título y SQL)
+    por video_id, hash del prompt (incluye el idioma destino) y modelo. El SQL guarda el
+    formato y el VOCABULARY_STORE con que se generó. Las entradas no expiran: se invalidan
+    explícitamente o con force_refresh.
+    """
+    def __init__(self):
+        with get_cache_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS processed_result_cache (
+                    video_id TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    processed_data TEXT NOT NULL,
+                    sql_format TEXT NOT NULL,
+                    vocabulary_store TEXT NOT NULL,
+                    sql_inserts TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, prompt_hash, model)
+                )""")
+
+    @staticmethod
+    def prompt_hash(prompt: str, target_language: str) -> str:
+        return hashlib.sha256(f"{target_language}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, video_id: str, prompt_hash: str, model: str) -> Optional[Dict[str, Any]]:
+        with get_cache_connection() as conn:
+            row = conn.execute(
+                "SELECT title, processed_data, sql_format, vocabulary_store, sql_inserts FROM processed_result_cache "
+                "WHERE video_id = ? AND prompt_hash = ? AND model = ?",
+                (video_id, prompt_hash, model)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "title": row[0],
+            "processed_data": json.loads(row[1]),
+            "sql_format": row[2],
+            "vocabulary_store": row[3],
+            "sql_inserts": row[4]
+        }
+
+    def set(self, video_id: str, prompt_hash: str, model: str, title: str, processed_data: Dict,
+            sql_format: str, vocabulary_store: str, sql_inserts: str):
+        with get_cache_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO processed_result_cache "
+                "(video_id, prompt_hash, model, title, processed_data, sql_format, vocabulary_store, sql_inserts, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (video_id, prompt_hash, model, title, json.dumps(processed_data, ensure_ascii=False),
+                 sql_format, vocabulary_store, sql_inserts, time.time())
+            )
+
+    def invalidate(self, video_id: str, prompt_hash: Optional[str] = None) -> int:
+        """
+        Elimina las entradas del video (o solo las de un prompt) y devuelve cuántas se borraron
+        """
+        with get_cache_connection() as conn:
+            if prompt_hash is None:
+                cursor = conn.execute("DELETE FROM processed_result_cache WHERE video_id = ?", (video_id,))
+            else:
+                cursor = conn.execute(
+                    "DELETE FROM processed_result_cache WHERE video_id = ? AND prompt_hash = ?",
+                    (video_id, prompt_hash)
+                )
+            return cursor.rowcount
+
+processed_result_cache = ProcessedResultCache()
+
+class LessonSnapshotStore:
+    """
+    Última versión de los datos procesados que está realmente en la base de datos, por video.
+    Es la versión "guardada" contra la que se calcula el SQL incremental (sql_format="diff").
+    Una versión pasa a ser la guardada al cargarse con write_to_database o cuando el cliente
+    confirma (acknowledge) que aplicó el SQL generado; hasta entonces queda pendiente.
+    """
+    max_pending = 5
+
+    def __init__(self):
+        with get_cache_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lesson_snapshots (
+                    video_id TEXT PRIMARY KEY,
+                    processed_data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lesson_snapshot_pending (
+                    video_id TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    processed_data TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, version)
+                )""")
+
+    def get(self, video_id: str) -> Optional[Dict]:
+        with get_cache_connection() as conn:
+            row = conn.execute(
+                "SELECT processed_data FROM lesson_snapshots WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, video_id: str, processed_data: Dict):
+        with get_cache_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO lesson_snapshots (video_id, processed_data, updated_at) VALUES (?, ?, ?)",
+                (video_id, json.dumps(processed_data, ensure_ascii=False), time.time())
+            )
+
+    def stage(self, video_id: str, processed_data: Dict) -> str:
+        """
+        Guarda una versión para la que se generó SQL sin aplicarlo y devuelve su identificador
+        (hash del contenido). Solo se conservan las últimas max_pending versiones por video.
+        """
+        data = json.dumps(processed_data, ensure_ascii=False, sort_keys=True)
+        version = hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+        with get_cache_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO lesson_snapshot_pending (video_id, version, processed_data, created_at) VALUES (?, ?, ?, ?)",
+                (video_id, version, data, time.time())
+            )
+            conn.execute(
+                "DELETE FROM lesson_snapshot_pending WHERE video_id = ? AND version NOT IN ("
+                "SELECT version FROM lesson_snapshot_pending WHERE video_id = ? ORDER BY created_at DESC LIMIT ?)",
+                (video_id, video_id, self.max_pending)
+            )
+        return version
+
+    def acknowledge(self, video_id: str, version: str) -> bool:
+        """
+        Marca como guardada una versión pendiente (el SQL generado para ella ya se aplicó)
+        """
+        with get_cache_connection() as conn:
+            row = conn.execute(
+                "SELECT processed_data FROM lesson_snapshot_pending WHERE video_id = ? AND version = ?",
+                (video_id, version)
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO lesson_snapshots (video_id, processed_data, updated_at) VALUES (?, ?, ?)",
+                (video_id, row[0], time.time())
+            )
+            conn.execute("DELETE FROM lesson_snapshot_pending WHERE video_id = ?", (video_id,))
+        return True
+
+lesson_snapshots = LessonSnapshotStore()
+
+def fetch_transcript(video_id: str, language: str = "en") -> Dict[str, Any]:
+    """
+    Obtiene la transcripción de un video usando la caché persistente.
+    Devuelve un dict con 'data' (lista de segmentos) y 'language_code'.
+    """
+    cached = transcript_cache.get(video_id, language)
+    if cached is not None:
+        print(f"[debug-server] transcript cache hit ({video_id}, {language})")
+        if cached["error"] is not None:
+            raise ValueError(f"No transcript available for video {video_id}: {cached['error']}")
+        return {"data": cached["data"], "language_code": cached["language_code"]}
+
+    print(f"[debug-server] transcript cache miss ({video_id}, {language})")
+    try:
+        ytt_api = YouTubeTranscriptApi()
+        fetched_transcript = ytt_api.fetch(video_id, languages=[language])
+    except (TranscriptsDisabled, NoTranscriptFound, VideoUnavailable) as e:
+        error = type(e).__name__
+        transcript_cache.set_missing(video_id, language, error)
+        raise ValueError(f"No transcript available for video {video_id}: {error}")
+
+    data = fetched_transcript.to_raw_data()
+    transcript_cache.set(video_id, language, fetched_transcript.language_code, data)
+    if data:
+        video_metadata.set_duration(video_id, data[-1]['start'] + data[-1]['duration'])
+    return {"data": data, "language_code": fetched_transcript.language_code}
+
+def get_video_id(url: str) -> Optional[str]:
+    """
+    Extrae el video_id (parámetro 'v') de una URL de YouTube
+    """
+    query_params = parse_qs(urlparse(url).query)
+    return query_params.get("v", [None])[0]
+
+def add_segment_end_times(data: List[Dict]) -> List[Dict]:
+    """
+    Agrega el campo 'end' a cada segmento: el inicio del siguiente segmento,
+    y para el último start + duration + 1 segundo extra para mejor reproducción
+    """
+    for i in range(len(data) - 1):
+        data[i]['end'] = data[i + 1]['start']
+    if data:
+        data[-1]['end'] = data[-1]['start'] + data[-1]['duration'] + 1
+    return data
+
+def clean_video_title(title: str, video_id: str) -> str:
+    """
+    Limpia el título del video y lo limita para la base de datos
+    """
+    title = (title or "").replace(' - YouTube', '').replace(' | YouTube', '').strip()
+    if not title:
         return f"Video {video_id}"
+    if len(title) > 200:
+        title = title[:197] + "..."
+    return title
+
+class VideoMetadataService:
+    """
+    Metadatos de videos de YouTube (título, autor, miniatura y duración) desde el endpoint
+    oEmbed, que devuelve un JSON pequeño en lugar de la página completa del video.
+    Los resultados se guardan en caché por video_id con TTL y las consultas de varios
+    videos se hacen en paralelo con un cliente HTTP compartido.
+    """
+    def __init__(self, oembed_url: str, ttl: int, concurrency: int, timeout: float):
+        self.oembed_url = oembed_url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = None
+        with get_cache_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS video_metadata (
+                    video_id TEXT PRIMARY KEY,
+                    title TEXT,
+                    author TEXT,
+                    thumbnail_url TEXT,
+                    duration REAL,
+                    created_at REAL NOT NULL
+                )""")
+
+    def _get_cached(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not video_ids:
+            return {}
+        with get_cache_connection() as conn:
+            rows = conn.execute(
+                f"SELECT video_id, title, author, thumbnail_url, duration, created_at FROM video_metadata "
+                f"WHERE video_id IN ({', '.join(['?'] * len(video_ids))})",
+                video_ids
+            ).fetchall()
+        now = time.time()
+        return {
+            row[0]: {"video_id": row[0], "title": row[1], "author": row[2], "thumbnail_url": row[3], "duration": row[4]}
+            for row in rows
+            if row[1] is not None and now - row[5] <= self.ttl
+        }
+
+    def _store(self, metadata: Dict[str, Any]):
+        # Conservar la duración ya conocida (oEmbed no la incluye)
+        with get_cache_connection() as conn:
+            conn.execute(
+                "INSERT INTO video_metadata (video_id, title, author, thumbnail_url, duration, created_at) VALUES (?, ?, ?, ?, NULL, ?) "
+                "ON CONFLICT(video_id) DO UPDATE SET title = excluded.title, author = excluded.author, "
+                "thumbnail_url = excluded.thumbnail_url, created_at = excluded.created_at",
+                (metadata["video_id"], metadata["title"], metadata["author"], metadata["thumbnail_url"], time.time())
+            )
+
+    def set_duration(self, video_id: str, duration: float):
+        """
+        Guarda la duración del video (calculada desde la transcripción)
+        """
+        with get_cache_connection() as conn:
+            conn.execute(
+                "INSERT INTO video_metadata (video_id, duration, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(video_id) DO UPDATE SET duration = excluded.duration",
+                (video_id, duration, time.time())
+            )
+
+    def _parse(self, video_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "video_id": video_id,
+            "title": clean_video_title(data.get("title", ""), video_id),
+            "author": data.get("author_name"),
+            "thumbnail_url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+            "duration": None
+        }
+
+    def _fallback(self, video_id: str) -> Dict[str, Any]:
+        return {
+            "video_id": video_id,
+            "title": f"Video {video_id}",
+            "author": None,
+            "thumbnail_url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+            "duration": None
+        }
+
+    def _oembed_params(self, video_id: str) -> Dict[str, str]:
+        return {"url": f"https://www.youtube.com/watch?v={video_id}", "format": "json"}
+
+    async def _fetch(self, video_id: str) -> Dict[str, Any]:
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout)
+        async with self.semaphore:
+            try:
+                response = await self.client.get(self.oembed_url, params=self._oembed_params(video_id))
+                response.raise_for_status()
+                metadata = self._parse(video_id, response.json())
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Error obteniendo metadatos del video {video_id}: {str(e)}")
+                return self._fallback(video_id)
+        await run_blocking(self._store, metadata)
+        return metadata
+
+    async def get_many(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Devuelve video_id -> metadatos. Consulta oEmbed solo para los videos que no están en caché.
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        metadata = await run_blocking(self._get_cached, video_ids)
+        misses = [video_id for video_id in video_ids if video_id not in metadata]
+        if misses:
+            print(f"[debug-server] video metadata: {len(metadata)} cached, fetching {len(misses)}")
+            for result in await asyncio.gather(*(self._fetch(video_id) for video_id in misses)):
+                metadata[result["video_id"]] = result
+        return metadata
+
+    async def get(self, video_id: str) -> Dict[str, Any]:
+        return (await self.get_many([video_id]))[video_id]
+
+    def get_sync(self, video_id: str) -> Dict[str, Any]:
+        """
+        Versión síncrona de get() para código que no corre en el event loop
+        """
+        cached = self._get_cached([video_id])
+        if video_id in cached:
+            return cached[video_id]
+        try:
+            response = requests.get(self.oembed_url, params=self._oembed_params(video_id), timeout=self.timeout)
+            response.raise_for_status()
+            metadata = self._parse(video_id, response.json())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error obteniendo metadatos del video {video_id}: {str(e)}")
+            return self._fallback(video_id)
+        self._store(metadata)
+        return metadata
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+video_metadata = VideoMetadataService(
+    oembed_url=os.getenv("YOUTUBE_OEMBED_URL", "https://www.youtube.com/oembed"),
+    ttl=int(os.getenv("VIDEO_METADATA_TTL", 7 * 24 * 3600)),
+    concurrency=int(os.getenv("VIDEO_METADATA_CONCURRENCY", 8)),
+    timeout=float(os.getenv("VIDEO_METADATA_TIMEOUT", 10))
+)
+
+def get_youtube_video_title(video_id: str) -> str:
+    """
+    Obtiene el título real del video de YouTube (oEmbed con caché)
+    """
+    return video_metadata.get_sync(video_id)["title"]
 
 @app.post("/crawl", response_model=CrawlResponse)
 async def crawl_website(request: CrawlRequest, _: None = Depends(verify_api_key)):
@@ -154,7 +618,7 @@ async def browser_agent(request: BrowserAgentRequest, _: None = Depends(verify_a
     """
     try:
         print(f"[debug-server] browser_agent({request.prompt})")
-        llm = ChatOpenAI(model="gpt-4o")
+        llm = ChatOpenAI(model=BROWSER_AGENT_MODEL)
         
         # Create browser configuration with headless mode
         browser_config = BrowserConfig(headless=True)
@@ -272,155 +736,805 @@ async def youtube_transcript(request: YouTubeTranscriptRequest, _: None = Depend
         if not video_id:
             raise HTTPException(status_code=400, detail="Invalid YouTube URL. Could not extract video ID.")
         
-        # Fetch transcript
-        ytt_api = YouTubeTranscriptApi()
-        fetched_transcript = ytt_api.fetch(video_id)
+        # Fetch transcript (cached by video_id and language) off the event loop
+        transcript = await run_blocking(fetch_transcript, video_id, request.language)
         
         # Get raw data
-        data = fetched_transcript.to_raw_data()
+        data = transcript["data"]
 
-        if data[-1]['start'] + data[-1]['duration'] > 1000:
-            raise HTTPException(status_code=400, detail="Video is too long. Please select a shorter video.")
-        
+        if not data:
+            raise HTTPException(status_code=400, detail="Transcript is empty.")
         
         # Process the transcript data to add end times
-        for i in range(len(data) - 1):
-            data[i]['end'] = data[i + 1]['start']
-        
-        # Last element: end = start + duration + 1 second extra for better playback
-        data[-1]['end'] = data[-1]['start'] + data[-1]['duration'] + 1
+        add_segment_end_times(data)
         
         return YouTubeTranscriptResponse(
             transcript=data,
             video_id=video_id,
             url=request.url,
-            language=fetched_transcript.language_code,
+            language=transcript["language_code"],
             translate_code=request.translate_code
         )
     except Exception as e:
         print(f"[debug-server] Error extracting YouTube transcript: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error extracting YouTube transcript: {str(e)}")
 
-async def process_transcript_and_generate_sql(url: str, prompt: str) -> ProcessTranscriptResponse:
+async def run_stage_graph(stages: Dict[str, tuple], timings: Dict[str, float]) -> Dict[str, Any]:
     """
-    Procesa una transcripción de YouTube y genera INSERT SQL para la base de datos
+    Ejecuta un grafo de etapas. `stages` es nombre -> (dependencias, función async que recibe
+    el dict de resultados de sus dependencias). Cada etapa arranca en cuanto terminan sus
+    dependencias, así que las etapas independientes corren en paralelo. Guarda en `timings`
+    la duración de cada etapa en segundos.
     """
+    tasks = {}
+    
+    async def run_stage(name: str):
+        dependencies, func = stages[name]
+        inputs = {dependency: await tasks[dependency] for dependency in dependencies}
+        start = time.perf_counter()
+        result = await func(inputs)
+        timings[name] = round(time.perf_counter() - start, 3)
+        return result
+    
+    for name in stages:
+        tasks[name] = asyncio.ensure_future(run_stage(name))
     try:
-        # 1. Obtener la transcripción
-        parsed_url = urlparse(url)
-        query_params = parse_qs(parsed_url.query)
-        video_id = query_params.get("v", [None])[0]
+        await asyncio.gather(*tasks.values())
+    except Exception:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    return {name: task.result() for name, task in tasks.items()}
+
+async def process_transcript_and_generate_sql(url: str, prompt: str, target_language: str = "es",
+                                              sql_format: str = "statements",
+                                              write_to_database: bool = False,
+                                              force_refresh: bool = False) -> ProcessTranscriptResponse:
+    """
+    Procesa una transcripción de YouTube y genera INSERT SQL para la base de datos.
+    El resultado se guarda en caché por video, prompt y modelo; force_refresh lo ignora y lo reemplaza.
+    Las etapas se ejecutan como un grafo: los metadatos del video se obtienen en paralelo con la
+    transcripción y la IA, y la respuesta incluye la duración de cada etapa en stats.timings.
+    """
+    try:
+        pipeline_start = time.perf_counter()
+        timings = {}
+        
+        video_id = get_video_id(url)
         
         if not video_id:
             raise ValueError("Invalid YouTube URL. Could not extract video ID.")
         
-        # Obtener transcripción
-        ytt_api = YouTubeTranscriptApi()
-        fetched_transcript = ytt_api.fetch(video_id)
-        raw_data = fetched_transcript.to_raw_data()
+        prompt_hash = ProcessedResultCache.prompt_hash(prompt, target_language)
+        if not force_refresh:
+            start = time.perf_counter()
+            cached = await run_blocking(processed_result_cache.get, video_id, prompt_hash, TRANSCRIPT_MODEL)
+            timings["result_cache"] = round(time.perf_counter() - start, 3)
+            if cached is not None:
+                print(f"[debug-server] processed result cache hit ({video_id}, {prompt_hash[:12]}, {TRANSCRIPT_MODEL})")
+                stats = {"result_cache": "hit", "timings": timings}
+                response = await build_process_transcript_response(
+                    cached["processed_data"], video_id, url, cached["title"], sql_format, write_to_database,
+                    stats,
+                    # El SQL incremental depende de la última versión generada: nunca se reutiliza.
+                    # Tampoco el generado para otro VOCABULARY_STORE (las tablas de vocabulario cambian)
+                    cached["sql_inserts"]
+                    if cached["sql_format"] == sql_format != "diff" and cached["vocabulary_store"] == VOCABULARY_STORE
+                    else None
+                )
+                timings["total"] = round(time.perf_counter() - pipeline_start, 3)
+                return response
         
-        # 2. Procesar la transcripción según el prompt
-        processed_data = await process_transcript_with_ai(raw_data, prompt, video_id, url)
+        stats = {"result_cache": "refresh" if force_refresh else "miss", "timings": timings}
         
-        # 3. Generar INSERT SQL
-        sql_inserts = generate_sql_inserts(processed_data, video_id, url)
+        async def metadata_stage(inputs: Dict) -> Dict[str, Any]:
+            return await video_metadata.get(video_id)
+        
+        async def transcript_stage(inputs: Dict) -> List[Dict]:
+            # Obtener transcripción (desde la caché si está disponible) fuera del event loop
+            transcript = await run_blocking(fetch_transcript, video_id)
+            return transcript["data"]
+        
+        async def process_stage(inputs: Dict) -> Dict:
+            # Procesar la transcripción según el prompt
+            return await process_transcript_with_ai(
+                inputs["transcript"], prompt, video_id, url, target_language, stats, force_refresh
+            )
+        
+        async def sql_stage(inputs: Dict) -> str:
+            return await run_blocking(
+                generate_sql_for_format, inputs["process"], video_id, url, inputs["metadata"]["title"], sql_format
+            )
+        
+        async def database_stage(inputs: Dict) -> Optional[Dict]:
+            # Cargar directamente en la base de datos (opcional)
+            if not write_to_database:
+                return None
+            return await run_blocking(
+                get_lesson_writer().write, inputs["process"], video_id, url, inputs["metadata"]["title"]
+            )
+        
+        async def cache_stage(inputs: Dict) -> None:
+            await run_blocking(
+                processed_result_cache.set, video_id, prompt_hash, TRANSCRIPT_MODEL, inputs["metadata"]["title"],
+                inputs["process"], sql_format, VOCABULARY_STORE, inputs["sql"]
+            )
+        
+        stages = {
+            "metadata": ([], metadata_stage),
+            "transcript": ([], transcript_stage),
+            "process": (["transcript"], process_stage),
+            "sql": (["process", "metadata"], sql_stage),
+            "database": (["process", "metadata"], database_stage),
+            "cache": (["sql", "process", "metadata"], cache_stage)
+        }
+        if not write_to_database:
+            del stages["database"]
+        
+        results = await run_stage_graph(stages, timings)
+        if results.get("database") is not None:
+            stats["database_load"] = results["database"]
+        await record_lesson_snapshot(results["process"], video_id, write_to_database, stats)
+        timings["total"] = round(time.perf_counter() - pipeline_start, 3)
         
         return ProcessTranscriptResponse(
-            sql_inserts=sql_inserts,
-            processed_data=processed_data
+            sql_inserts=results["sql"],
+            processed_data=results["process"],
+            stats=stats
         )
         
     except Exception as e:
         print(f"Error processing transcript: {str(e)}")
         raise e
 
-async def process_transcript_with_ai(transcript_data: List[Dict], prompt: str, video_id: str, url: str) -> Dict:
+def generate_sql_for_format(processed_data: Dict, video_id: str, url: str, title: str, sql_format: str) -> str:
+    """
+    Genera el SQL en el formato pedido: "bulk" (cadena de CTEs), "statements" (un INSERT por fila)
+    o "diff" (solo los cambios respecto de la versión guardada; si no hay una versión
+    guardada se generan los INSERT completos).
+    """
+    if sql_format == "diff":
+        previous = lesson_snapshots.get(video_id)
+        if previous is not None:
+            sql_inserts = generate_diff_sql(previous, processed_data, video_id, title)
+        else:
+            print(f"[debug-server] No stored version for {video_id}, generating full inserts")
+            sql_inserts = generate_sql_inserts(processed_data, video_id, url, title)
+    elif sql_format == "bulk":
+        sql_inserts = generate_bulk_sql_inserts(processed_data, video_id, url, title)
+    else:
+        sql_inserts = generate_sql_inserts(processed_data, video_id, url, title)
+    return sql_inserts
+
+async def record_lesson_snapshot(processed_data: Dict, video_id: str, written: bool, stats: Dict):
     """
-    Procesa la transcripción usando IA para agrupar clips, traducir y extraer vocabulario
+    Si la lección se cargó en la base de datos, su versión pasa a ser la guardada; si no, queda
+    pendiente y stats.snapshot_version permite confirmarla después de aplicar el SQL
     """
-    # Crear el prompt completo para la IA
-    system_prompt = f"""
-    Actúa como un procesador de transcripciones de video para una aplicación de aprendizaje de idiomas. 
+    if written:
+        await run_blocking(lesson_snapshots.set, video_id, processed_data)
+    else:
+        stats["snapshot_version"] = await run_blocking(lesson_snapshots.stage, video_id, processed_data)
+
+async def build_process_transcript_response(processed_data: Dict, video_id: str, url: str, title: str,
+                                            sql_format: str, write_to_database: bool, stats: Dict,
+                                            sql_inserts: Optional[str] = None) -> ProcessTranscriptResponse:
+    """
+    Genera el SQL (si no viene ya generado), carga la lección en la base de datos si se pidió
+    y arma la respuesta de /process-transcript
+    """
+    if sql_inserts is None:
+        sql_inserts = await run_blocking(generate_sql_for_format, processed_data, video_id, url, title, sql_format)
     
-    {prompt}
+    # Cargar directamente en la base de datos (opcional)
+    if write_to_database:
+        stats["database_load"] = await run_blocking(get_lesson_writer().write, processed_data, video_id, url, title)
+    await record_lesson_snapshot(processed_data, video_id, write_to_database, stats)
     
-    Procesa la siguiente transcripción y devuelve solo el JSON transformado sin texto adicional.
+    return ProcessTranscriptResponse(
+        sql_inserts=sql_inserts,
+        processed_data=processed_data,
+        stats=stats
+    )
+
+class TranslationMemory:
+    """
+    Memoria de traducción persistente: guarda la traducción y el vocabulario de cada clip
+    por texto original normalizado, idioma destino y hash del prompt y modelo, para
+    reutilizarlos entre videos procesados con el mismo prompt.
+    Además de la coincidencia exacta, acepta textos casi idénticos por similitud, siempre que
+    solo difieran en espacios, apóstrofes o palabras repetidas (nunca en palabras nuevas).
     """
+    def __init__(self, similarity: float, max_candidates: int = 500):
+        self.similarity = similarity
+        self.max_candidates = max_candidates
+        with get_cache_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translation_memory (
+                    source_key TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    source_text TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    text_translate TEXT NOT NULL,
+                    vocabulary TEXT NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (source_key, target_language, prompt_hash)
+                )""")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS translation_memory_length ON translation_memory (target_language, prompt_hash, length)"
+            )
+
+    @staticmethod
+    def prompt_hash(prompt: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normaliza el texto: minúsculas, sin puntuación (salvo apóstrofes) y espacios simples
+        """
+        punctuation = string.punctuation.replace("'", "") + "¡¿…“”"
+        text = text.lower().replace("’", "'").translate(str.maketrans(punctuation, " " * len(punctuation)))
+        return " ".join(text.split())
+
+    @staticmethod
+    def same_words(key: str, other: str) -> bool:
+        """
+        Indica si dos textos normalizados dicen lo mismo palabra por palabra: cada diferencia debe
+        ser de espacios/apóstrofes ("e mail" / "email") o una palabra repetida ("I I think").
+        Una palabra añadida o cambiada ("not") nunca cuenta como casi idéntica.
+        """
+        words, other_words = key.split(), other.split()
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, words, other_words, autojunk=False).get_opcodes():
+            if tag == "equal":
+                continue
+            if "".join(words[i1:i2]).replace("'", "") == "".join(other_words[j1:j2]).replace("'", ""):
+                continue
+            if tag == "delete":
+                sequence, start, end = words, i1, i2
+            elif tag == "insert":
+                sequence, start, end = other_words, j1, j2
+            else:
+                return False
+            neighbours = set(sequence[max(start - 1, 0):start] + sequence[end:end + 1])
+            if not set(sequence[start:end]) <= neighbours:
+                return False
+        return True
+
+    def _find_similar(self, conn: sqlite3.Connection, key: str, target_language: str, prompt_hash: str) -> Optional[tuple]:
+        margin = max(2, int(len(key) * (1 - self.similarity)) + 1)
+        rows = conn.execute(
+            "SELECT source_key, text_translate, vocabulary FROM translation_memory "
+            "WHERE target_language = ? AND prompt_hash = ? AND length BETWEEN ? AND ? LIMIT ?",
+            (target_language, prompt_hash, len(key) - margin, len(key) + margin, self.max_candidates)
+        ).fetchall()
+        best = None
+        best_ratio = self.similarity
+        for row in rows:
+            matcher = SequenceMatcher(None, key, row[0])
+            if matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio and self.same_words(key, row[0]):
+                best, best_ratio = row, ratio
+        return best
+
+    def lookup_many(self, texts: List[str], target_language: str, prompt_hash: str) -> Dict[int, Dict]:
+        """
+        Busca cada texto en la memoria. Devuelve índice -> {'text_translate', 'vocabulary', 'match'}
+        solo para los textos encontrados ('match' es 'exact' o 'near').
+        """
+        found = {}
+        with get_cache_connection() as conn:
+            for i, text in enumerate(texts):
+                key = self.normalize(text)
+                if not key:
+                    continue
+                match = "exact"
+                row = conn.execute(
+                    "SELECT source_key, text_translate, vocabulary FROM translation_memory "
+                    "WHERE source_key = ? AND target_language = ? AND prompt_hash = ?",
+                    (key, target_language, prompt_hash)
+                ).fetchone()
+                if row is None and self.similarity < 1:
+                    match = "near"
+                    row = self._find_similar(conn, key, target_language, prompt_hash)
+                if row is None:
+                    continue
+                conn.execute(
+                    "UPDATE translation_memory SET hits = hits + 1 "
+                    "WHERE source_key = ? AND target_language = ? AND prompt_hash = ?",
+                    (row[0], target_language, prompt_hash)
+                )
+                found[i] = {
+                    "text_translate": row[1],
+                    "vocabulary": json.loads(row[2]),
+                    "match": match
+                }
+        return found
+
+    def store_many(self, entries: List[tuple], target_language: str, prompt_hash: str):
+        """
+        Guarda pares (texto original, {'text_translate', 'vocabulary'}) en la memoria
+        """
+        now = time.time()
+        rows = []
+        for text, translation in entries:
+            key = self.normalize(text)
+            if not key or not translation.get('text_translate'):
+                continue
+            rows.append((
+                key, target_language, prompt_hash, text, len(key), translation['text_translate'],
+                json.dumps(translation.get('vocabulary', []), ensure_ascii=False), now
+            ))
+        with get_cache_connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO translation_memory "
+                "(source_key, target_language, prompt_hash, source_text, length, text_translate, vocabulary, hits, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                rows
+            )
+
+translation_memory = TranslationMemory(similarity=float(os.getenv("TRANSLATION_MEMORY_SIMILARITY", 0.95)))
+
+# Reglas del agrupamiento local de clips
+CLIP_MAX_SEGMENTS = int(os.getenv("CLIP_MAX_SEGMENTS", 3))
+CLIP_MAX_GAP = float(os.getenv("CLIP_MAX_GAP", 1.0))
+CLIP_MAX_DURATION = float(os.getenv("CLIP_MAX_DURATION", 15.0))
+
+# Configuración del procesamiento por ventanas (map-reduce) de transcripciones largas
+TRANSCRIPT_CHUNK_SEGMENTS = int(os.getenv("TRANSCRIPT_CHUNK_SEGMENTS", 60))
+TRANSCRIPT_CHUNK_OVERLAP = int(os.getenv("TRANSCRIPT_CHUNK_OVERLAP", 3))
+TRANSCRIPT_CHUNK_CONCURRENCY = int(os.getenv("TRANSCRIPT_CHUNK_CONCURRENCY", 4))
+
+# Un segmento cierra una oración si termina en puntuación final (ignorando comillas/paréntesis)
+SENTENCE_END_RE = re.compile(r'[.!?…]["\')\]]*\s*$')
+
+TRANSLATION_SYSTEM_PROMPT = """
+Actúa como un procesador de transcripciones de video para una aplicación de aprendizaje de idiomas.
+
+Los clips ya están agrupados y sus tiempos calculados: ignora cualquier instrucción de agrupar clips
+o recalcular start, end o duration. Tu única tarea es traducir cada clip y extraer su vocabulario
+siguiendo estas instrucciones:
+
+{prompt}
+
+Recibirás los clips uno por línea con el formato `índice|texto`.
+Responde solo con JSON compacto, sin texto adicional, con esta forma:
+{{"c":[{{"i":0,"t":"traducción del clip","v":[{{"w":"palabra o frase original","tr":"traducción","n":"nota opcional o null"}}]}}]}}
+Incluye una entrada por cada índice recibido.
+"""
+
+# Reintentos para volver a pedir solo los clips que faltaron o no pasaron la validación
+TRANSCRIPT_REPAIR_ATTEMPTS = int(os.getenv("TRANSCRIPT_REPAIR_ATTEMPTS", 2))
+
+# response_format de OpenAI con el esquema estricto de TranslatedClips
+TRANSLATION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "translated_clips",
+        "strict": True,
+        "schema": TranslatedClips.model_json_schema()
+    }
+}
+
+def group_transcript_segments(transcript_data: List[Dict], max_segments: int = CLIP_MAX_SEGMENTS,
+                              max_gap: float = CLIP_MAX_GAP, max_duration: float = CLIP_MAX_DURATION) -> List[Dict]:
+    """
+    Agrupa segmentos consecutivos de la transcripción en clips de forma determinista.
+    Un clip se cierra cuando termina una oración, cuando alcanza `max_segments` segmentos,
+    cuando la pausa hasta el siguiente segmento supera `max_gap` segundos o cuando
+    agregar el siguiente segmento superaría `max_duration` segundos.
+    """
+    segments = add_segment_end_times([dict(segment) for segment in transcript_data])
+    clips = []
+    group = []
+    
+    def close_group():
+        start = group[0]['start']
+        end = group[-1]['end']
+        clips.append({
+            "text": " ".join(segment['text'].strip() for segment in group).replace("\n", " "),
+            "start": round(start, 3),
+            "end": round(end, 3),
+            "duration": round(end - start, 3)
+        })
+    
+    for segment in segments:
+        if group:
+            previous = group[-1]
+            gap = segment['start'] - (previous['start'] + previous['duration'])
+            if (len(group) >= max_segments
+                    or SENTENCE_END_RE.search(previous['text'])
+                    or gap > max_gap
+                    or segment['end'] - group[0]['start'] > max_duration):
+                close_group()
+                group = []
+        group.append(segment)
+    
+    if group:
+        close_group()
+    return clips
+
+def split_transcript_into_chunks(clips: List[Dict], max_segments: int, overlap: int,
+                                 indexes: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Divide los clips a procesar (`indexes`, por defecto todos) en ventanas que terminan
+    en un final de oración. Cada ventana lleva los `overlap` clips anteriores a su primer
+    clip como contexto, que la IA usa como referencia pero no debe traducir.
+    """
+    if indexes is None:
+        indexes = list(range(len(clips)))
+    chunks = []
+    total = len(indexes)
+    start = 0
+    while start < total:
+        end = min(start + max_segments, total)
+        # Extender la ventana hasta el final de la oración, como máximo media ventana más
+        limit = min(start + max_segments + max_segments // 2, total)
+        while end < limit and not SENTENCE_END_RE.search(clips[indexes[end - 1]].get('text', '')):
+            end += 1
+        first = indexes[start]
+        chunks.append({
+            "indexes": indexes[start:end],
+            "context": clips[max(0, first - overlap):first],
+            "segments": [clips[i] for i in indexes[start:end]]
+        })
+        start = end
+    return chunks
+
+class IncrementalClipParser:
+    """
+    Parser JSON incremental para la respuesta compacta de la IA ({"c":[{...},{...}]}).
+    Recibe el texto a medida que llega del stream y devuelve cada objeto de clip
+    en cuanto se cierra, sin esperar al resto de la respuesta.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.item_start = None
+
+    def feed(self, text: str) -> List[Dict]:
+        self.buffer += text
+        items = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+                # Profundidad 3: objeto de clip dentro de la lista "c" del objeto raíz
+                if char == "{" and self.depth == 3:
+                    self.item_start = self.position
+            elif char in "}]":
+                if char == "}" and self.depth == 3 and self.item_start is not None:
+                    try:
+                        items.append(json.loads(self.buffer[self.item_start:self.position + 1]))
+                    except json.JSONDecodeError as e:
+                        print(f"[debug-server] Warning: could not parse streamed clip: {e}")
+                    self.item_start = None
+                self.depth -= 1
+            self.position += 1
+        return items
+
+def build_translation_prompt(chunk: Dict, prompt: str) -> str:
+    """
+    Construye el prompt de traducción de una ventana de clips (formato `índice|texto`)
+    """
+    lines = [f"{i}|{clip['text']}" for i, clip in zip(chunk["indexes"], chunk["segments"])]
+    full_prompt = TRANSLATION_SYSTEM_PROMPT.format(prompt=prompt)
+    if chunk["context"]:
+        context = "\n".join(clip['text'] for clip in chunk["context"])
+        full_prompt += f"\nContexto previo (solo referencia, no traducir):\n{context}\n"
+    full_prompt += "\nClips a procesar:\n" + "\n".join(lines)
+    return full_prompt
+
+async def stream_transcript_chunk_with_ai(llm: Runnable, chunk: Dict, prompt: str, clips: List[Dict]):
+    """
+    Traduce una ventana de clips con IA consumiendo la respuesta como stream.
+    Cada clip se valida con TranslatedClip en cuanto se cierra y se genera
+    (índice global, {'text_translate', 'vocabulary'}). Los clips que faltan o no pasan
+    la validación se vuelven a pedir solos, hasta TRANSCRIPT_REPAIR_ATTEMPTS veces.
+    """
+    pending = set(chunk["indexes"])
+    request_chunk = chunk
+    for attempt in range(TRANSCRIPT_REPAIR_ATTEMPTS + 1):
+        parser = IncrementalClipParser()
+        async for message_chunk in llm.astream(build_translation_prompt(request_chunk, prompt)):
+            for item in parser.feed(message_chunk.content):
+                try:
+                    clip = TranslatedClip.model_validate(item)
+                except ValidationError as e:
+                    print(f"[debug-server] Warning: invalid clip in AI response: {item} ({e.errors()})")
+                    continue
+                if clip.i in pending:
+                    pending.discard(clip.i)
+                    yield clip.i, clip.to_translation()
+        
+        if not pending or attempt == TRANSCRIPT_REPAIR_ATTEMPTS:
+            break
+        # Volver a pedir solo el rango de clips que falló
+        failed = sorted(pending)
+        print(f"[debug-server] Repairing {len(failed)} clips (attempt {attempt + 1}): {failed}")
+        request_chunk = split_transcript_into_chunks(clips, len(failed), TRANSCRIPT_CHUNK_OVERLAP, failed)[0]
+
+def merge_processed_chunks(clips: List[Dict], results: List[Dict[int, Dict]], video_id: str, url: str) -> Dict:
+    """
+    Aplica en orden las traducciones y el vocabulario de cada ventana a los clips agrupados
+    """
+    translations = {}
+    for result in results:
+        translations.update(result)
+    
+    transcript = []
+    for i, clip in enumerate(clips):
+        translation = translations.get(i)
+        if translation is None:
+            print(f"[debug-server] Warning: missing translation for clip {i}")
+            translation = {"text_translate": "", "vocabulary": []}
+        transcript.append({**clip, **translation})
     
-    # Preparar los datos para la IA
-    input_data = {
-        "transcript": transcript_data,
+    return {
+        "transcript": transcript,
         "video_id": video_id,
         "url": url,
         "language": "en"
     }
+
+async def stream_clip_translations(clips: List[Dict], prompt: str, target_language: str = "es",
+                                   stats: Optional[Dict] = None, force_refresh: bool = False):
+    """
+    Genera (índice, {'text_translate', 'vocabulary'}) para cada clip agrupado, en el orden
+    en que quedan listos. Los clips presentes en la memoria de traducción (para el mismo prompt
+    y modelo) salen primero; el resto se envía a la IA por ventanas en paralelo y se emite a
+    medida que cada clip se cierra en el stream. Con force_refresh no se consulta la memoria
+    y todas las traducciones nuevas la reemplazan. Si se recibe `stats`, se agregan las métricas.
+    """
+    texts = [clip['text'] for clip in clips]
+    prompt_hash = TranslationMemory.prompt_hash(prompt, TRANSCRIPT_MODEL)
+    cached = {}
+    if not force_refresh:
+        cached = await run_blocking(translation_memory.lookup_many, texts, target_language, prompt_hash)
+    misses = [i for i in range(len(clips)) if i not in cached]
+    
+    if stats is not None:
+        exact_hits = sum(1 for hit in cached.values() if hit['match'] == "exact")
+        stats["translation_memory"] = {
+            "clips": len(clips),
+            "exact_hits": exact_hits,
+            "near_hits": len(cached) - exact_hits,
+            "misses": len(misses),
+            "hit_rate": round(len(cached) / len(clips), 3) if clips else 0.0,
+            "refresh": force_refresh
+        }
+    
+    for i in sorted(cached):
+        yield i, {"text_translate": cached[i]['text_translate'], "vocabulary": cached[i]['vocabulary']}
     
-    # Usar OpenAI para procesar
-    llm = ChatOpenAI(model="gpt-4o")
+    chunks = split_transcript_into_chunks(clips, TRANSCRIPT_CHUNK_SEGMENTS, TRANSCRIPT_CHUNK_OVERLAP, misses)
+    print(f"[debug-server] stream_clip_translations: {len(clips)} clips, "
+          f"{len(cached)} from translation memory, {len(misses)} in {len(chunks)} chunks")
+    if not chunks:
+        return
     
-    # Crear el mensaje completo
-    full_prompt = f"{system_prompt}\n\nJSON a procesar:\n{json.dumps(input_data, indent=2)}"
+    # Usar OpenAI para procesar, con structured output estricto
+    llm = ChatOpenAI(model=TRANSCRIPT_MODEL).bind(response_format=TRANSLATION_RESPONSE_FORMAT)
+    semaphore = asyncio.Semaphore(TRANSCRIPT_CHUNK_CONCURRENCY)
+    queue = asyncio.Queue()
     
-    response = await llm.ainvoke(full_prompt)
+    async def run_chunk(chunk: Dict):
+        try:
+            async with semaphore:
+                async for item in stream_transcript_chunk_with_ai(llm, chunk, prompt, clips):
+                    await queue.put(item)
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
     
+    tasks = [asyncio.create_task(run_chunk(chunk)) for chunk in chunks]
+    pending = set(misses)
+    new_entries = []
     try:
-        # Extraer el JSON de la respuesta
-        response_text = response.content
-        # Buscar el JSON en la respuesta
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            processed_data = json.loads(json_match.group())
-            return processed_data
-        else:
-            raise ValueError("No se pudo extraer JSON válido de la respuesta de la IA")
-    except json.JSONDecodeError as e:
-        print(f"Error parsing AI response: {e}")
-        print(f"AI Response: {response_text}")
-        raise ValueError(f"Error parsing AI response: {e}")
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is None:
+                remaining -= 1
+                continue
+            if isinstance(item, Exception):
+                raise item
+            i, translation = item
+            if i not in pending:
+                continue
+            pending.discard(i)
+            new_entries.append((texts[i], translation))
+            yield i, translation
+    finally:
+        for task in tasks:
+            task.cancel()
+        if new_entries:
+            await run_blocking(translation_memory.store_many, new_entries, target_language, prompt_hash)
+    
+    for i in sorted(pending):
+        print(f"[debug-server] Warning: missing translation for clip {i}")
+        yield i, {"text_translate": "", "vocabulary": []}
 
-def generate_sql_inserts(processed_data: Dict, video_id: str, url: str) -> str:
+async def process_transcript_with_ai(transcript_data: List[Dict], prompt: str, video_id: str, url: str,
+                                     target_language: str = "es", stats: Optional[Dict] = None,
+                                     force_refresh: bool = False) -> Dict:
     """
-    Genera todos los INSERT SQL necesarios para la base de datos
+    Procesa la transcripción para agrupar clips, traducir y extraer vocabulario.
+    El agrupamiento se hace localmente; las traducciones salen de la memoria de traducción
+    o de la IA (ver stream_clip_translations) y se unen en orden.
+    """
+    clips = group_transcript_segments(transcript_data)
+    translations = {}
+    async for i, translation in stream_clip_translations(clips, prompt, target_language, stats, force_refresh):
+        translations[i] = translation
+    return merge_processed_chunks(clips, [translations], video_id, url)
+
+def sql_quote(value: Any) -> str:
+    """
+    Convierte un valor en literal SQL: NULL o texto entre comillas simples escapadas
+    """
+    if value is None:
+        return "NULL"
+    return "'" + str(value).replace("'", "''") + "'"
+
+def get_total_duration(processed_data: Dict) -> str:
+    """
+    Calcula la duración total de la lección (en segundos) desde el end del último clip
     """
-    sql_statements = []
-    
-    # Calcular la duración total de la lección desde el último clip
-    total_duration = "0"  # Por defecto en segundos
     if 'transcript' in processed_data and isinstance(processed_data['transcript'], list) and len(processed_data['transcript']) > 0:
         last_clip = processed_data['transcript'][-1]
-        total_duration_seconds = last_clip.get('end', 0)
-        # Mantener la duración en segundos para la base de datos
-        total_duration = str(int(total_duration_seconds))
-    
-    # Agregar inicio de transacción
-    sql_statements.append("BEGIN;")
-    
-    # 1. INSERT para la tabla lessons
-    title = get_youtube_video_title(video_id)  # Obtener título real del video
+        return str(int(last_clip.get('end', 0)))
+    return "0"
+
+# "per_clip": una fila de public.vocabulary por clip (formato original);
+# "dictionary": diccionario global deduplicado (public.vocabulary_dictionary) + enlaces por clip (public.clip_vocabulary)
+VOCABULARY_STORE = os.getenv("VOCABULARY_STORE", "per_clip")
+VOCABULARY_DICTIONARY_NAMESPACE = uuid.UUID("6f1c3c2e-8d1b-5a5e-9f43-2a7f1f0f6b1d")
+
+# Tablas del modo "dictionary" (PostgreSQL); las notas dependen del contexto y quedan en el enlace
+VOCABULARY_DICTIONARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS public.vocabulary_dictionary (
+    id uuid PRIMARY KEY,
+    word_key text NOT NULL UNIQUE,
+    original_word text NOT NULL,
+    translation text NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS public.clip_vocabulary (
+    clip_id uuid NOT NULL REFERENCES public.clips (id) ON DELETE CASCADE,
+    dictionary_id uuid NOT NULL REFERENCES public.vocabulary_dictionary (id),
+    notes text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (clip_id, dictionary_id)
+);
+"""
+
+def vocabulary_word_key(vocab: Dict) -> str:
+    """
+    Clave estable de una entrada del diccionario: palabra y traducción normalizadas.
+    El id de la fila se deriva de la clave (uuid5), así el SQL puede enlazarla sin consultarla.
+    """
+    word = " ".join(vocab.get('original_word', '').lower().split())
+    translation = " ".join(vocab.get('translation', '').lower().split())
+    return hashlib.sha256(f"{word}\n{translation}".encode("utf-8")).hexdigest()[:32]
+
+def vocabulary_dictionary_id(word_key: str) -> str:
+    return str(uuid.uuid5(VOCABULARY_DICTIONARY_NAMESPACE, word_key))
+
+def collect_vocabulary_dictionary(processed_data: Dict) -> tuple:
+    """
+    Deduplica el vocabulario de la lección: devuelve las entradas del diccionario
+    ({word_key: (id, original_word, translation)}) y los enlaces (order_index, dictionary_id, notes)
+    """
+    entries = {}
+    links = []
+    clips = processed_data.get('transcript') if isinstance(processed_data.get('transcript'), list) else []
+    for i, clip in enumerate(clips):
+        linked = set()
+        for vocab in clip.get('vocabulary') or []:
+            word_key = vocabulary_word_key(vocab)
+            dictionary_id = vocabulary_dictionary_id(word_key)
+            entries.setdefault(word_key, (dictionary_id, vocab.get('original_word', ''), vocab.get('translation', '')))
+            if dictionary_id not in linked:
+                linked.add(dictionary_id)
+                links.append((i + 1, dictionary_id, vocab.get('notes') or None))
+    return entries, links
+
+def generate_dictionary_schema() -> str:
+    """
+    En modo "dictionary" devuelve los CREATE TABLE IF NOT EXISTS de las tablas del diccionario,
+    para que los scripts generados funcionen sin una migración previa; en "per_clip", ""
+    """
+    if VOCABULARY_STORE != "dictionary":
+        return ""
+    return "\n-- Crear las tablas del diccionario de vocabulario si no existen\n" + VOCABULARY_DICTIONARY_SCHEMA.strip()
+
+def generate_dictionary_upsert(entries: Dict[str, tuple]) -> str:
+    """
+    Genera un único INSERT multi-fila del diccionario; las palabras ya guardadas se ignoran
+    """
+    if not entries:
+        return ""
+    rows = ",\n".join(
+        f"    ({sql_quote(dictionary_id)}::uuid, {sql_quote(word_key)}, {sql_quote(original_word)}, {sql_quote(translation)}, now())"
+        for word_key, (dictionary_id, original_word, translation) in entries.items()
+    )
+    return f"""
+-- Insertar {len(entries)} entradas del diccionario de vocabulario (las existentes se reutilizan)
+INSERT INTO public.vocabulary_dictionary (id, word_key, original_word, translation, created_at)
+VALUES
+{rows}
+ON CONFLICT (word_key) DO NOTHING;"""
+
+def generate_clip_vocabulary_links(links: List[tuple], clips_source: str) -> str:
+    """
+    Genera el INSERT de los enlaces clip-vocabulario uniendo por order_index con clips_source
+    (una tabla o CTE con columnas id y order_index)
+    """
+    rows = ",\n".join(
+        f"    ({order_index}, {sql_quote(dictionary_id)}::uuid, {sql_quote(notes)}::text)"
+        for order_index, dictionary_id, notes in links
+    )
+    return f"""INSERT INTO public.clip_vocabulary (clip_id, dictionary_id, notes, created_at)
+SELECT c.id, v.dictionary_id, v.notes, now()
+FROM (VALUES
+{rows}
+) AS v (order_index, dictionary_id, notes)
+JOIN {clips_source} c ON c.order_index = v.order_index
+ON CONFLICT (clip_id, dictionary_id) DO NOTHING;"""
+
+def latest_lesson_clips_sql(video_id: str) -> str:
+    """
+    Subconsulta con los clips (id, order_index) de la lección más reciente del video
+    """
+    return (f"(SELECT c.id, c.order_index FROM public.clips c WHERE c.lesson_id = "
+            f"(SELECT l.id FROM public.lessons l WHERE l.youtube_video_id = {sql_quote(video_id)} "
+            f"ORDER BY l.created_at DESC LIMIT 1))")
+
+def generate_lesson_insert(video_id: str, url: str, title: str, total_duration: str) -> str:
+    """
+    Genera el INSERT SQL de la lección
+    """
     language = "en"
     target_language = "English"
     thumbnail_url = f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
     
-    lesson_insert = f"""
+    return f"""
 -- Insertar lección con duración calculada desde el último clip
 -- Título: {title}
 -- Duración total: {total_duration} segundos (calculada desde end del último clip)
 INSERT INTO public.lessons (id, title, language, target_language, youtube_url, youtube_video_id, duration, thumbnail_url, status, created_at, updated_at)
-VALUES (gen_random_uuid(), '{title}', '{language}', '{target_language}', '{url}', '{video_id}', '{total_duration}', '{thumbnail_url}', 'ready', now(), now());"""
-    
-    sql_statements.append(lesson_insert)
+VALUES (gen_random_uuid(), {sql_quote(title)}, '{language}', '{target_language}', '{url}', '{video_id}', '{total_duration}', '{thumbnail_url}', 'ready', now(), now());"""
+
+def generate_clip_inserts(clip: Dict, order_index: int, video_id: str, include_vocabulary: bool = True) -> List[str]:
+    """
+    Genera el INSERT SQL de un clip y los de su vocabulario (include_vocabulary=False omite
+    el vocabulario, que en el modo "dictionary" se inserta como enlaces)
+    """
+    statements = []
+    start_time = clip.get('start', 0)
+    end_time = clip.get('end', 0)
+    original_text = clip.get('text', '').replace("'", "''")  # Escapar comillas simples
+    translated_text = clip.get('text_translate', '').replace("'", "''")
     
-    # 2. INSERT para la tabla clips
-    if 'transcript' in processed_data and isinstance(processed_data['transcript'], list):
-        for i, clip in enumerate(processed_data['transcript']):
-            start_time = clip.get('start', 0)
-            end_time = clip.get('end', 0)
-            original_text = clip.get('text', '').replace("'", "''")  # Escapar comillas simples
-            translated_text = clip.get('text_translate', '').replace("'", "''")
-            order_index = i + 1
-            
-            clip_insert = f"""
--- Insertar clip {i+1}
+    clip_insert = f"""
+-- Insertar clip {order_index}
 -- Nota: La duración incluye 1 segundo extra para mejor reproducción
 INSERT INTO public.clips (id, lesson_id, start_time, end_time, original_text, translated_text, order_index, created_at)
 SELECT 
@@ -436,18 +1550,18 @@ FROM public.lessons l
 WHERE l.youtube_video_id = '{video_id}'
 ORDER BY l.created_at DESC 
 LIMIT 1;"""
+    
+    statements.append(clip_insert)
+    
+    # INSERT para la tabla vocabulary
+    if include_vocabulary and 'vocabulary' in clip and isinstance(clip['vocabulary'], list):
+        for j, vocab in enumerate(clip['vocabulary']):
+            original_word = vocab.get('original_word', '').replace("'", "''")
+            translation = vocab.get('translation', '').replace("'", "''")
+            notes = vocab.get('notes', '').replace("'", "''") if vocab.get('notes') else None
             
-            sql_statements.append(clip_insert)
-            
-            # 3. INSERT para la tabla vocabulary
-            if 'vocabulary' in clip and isinstance(clip['vocabulary'], list):
-                for j, vocab in enumerate(clip['vocabulary']):
-                    original_word = vocab.get('original_word', '').replace("'", "''")
-                    translation = vocab.get('translation', '').replace("'", "''")
-                    notes = vocab.get('notes', '').replace("'", "''") if vocab.get('notes') else None
-                    
-                    vocab_insert = f"""
--- Insertar vocabulario {j+1} del clip {i+1}
+            vocab_insert = f"""
+-- Insertar vocabulario {j+1} del clip {order_index}
 INSERT INTO public.vocabulary (id, clip_id, original_word, translation, notes, created_at)
 SELECT 
     gen_random_uuid(),
@@ -461,23 +1575,495 @@ JOIN public.lessons l ON c.lesson_id = l.id
 WHERE l.youtube_video_id = '{video_id}' 
 AND c.order_index = {order_index}
 LIMIT 1;"""
-                    
-                    sql_statements.append(vocab_insert)
+            
+            statements.append(vocab_insert)
+    
+    return statements
+
+def generate_sql_inserts(processed_data: Dict, video_id: str, url: str, title: Optional[str] = None) -> str:
+    """
+    Genera todos los INSERT SQL necesarios para la base de datos.
+    Si no se recibe el título, se obtiene desde YouTube.
+    """
+    sql_statements = []
+    
+    # Calcular la duración total de la lección desde el último clip
+    total_duration = get_total_duration(processed_data)
+    
+    # Agregar inicio de transacción (y las tablas del diccionario en modo "dictionary")
+    sql_statements.append("BEGIN;" + generate_dictionary_schema())
+    
+    # 1. INSERT para la tabla lessons
+    if title is None:
+        title = get_youtube_video_title(video_id)  # Obtener título real del video
+    sql_statements.append(generate_lesson_insert(video_id, url, title, total_duration))
+    
+    # 2. INSERT para las tablas clips y vocabulary
+    use_dictionary = VOCABULARY_STORE == "dictionary"
+    if 'transcript' in processed_data and isinstance(processed_data['transcript'], list):
+        for i, clip in enumerate(processed_data['transcript']):
+            sql_statements.extend(generate_clip_inserts(clip, i + 1, video_id, include_vocabulary=not use_dictionary))
+    
+    # 3. Modo diccionario: un upsert del diccionario y un INSERT de enlaces para toda la lección
+    if use_dictionary:
+        entries, links = collect_vocabulary_dictionary(processed_data)
+        if links:
+            sql_statements.append(generate_dictionary_upsert(entries))
+            sql_statements.append(f"-- Enlazar {len(links)} entradas de vocabulario con sus clips\n"
+                                  + generate_clip_vocabulary_links(links, latest_lesson_clips_sql(video_id)))
     
     # Agregar commit
     sql_statements.append("COMMIT;")
     
     return "\n".join(sql_statements)
 
+def generate_bulk_sql_inserts(processed_data: Dict, video_id: str, url: str, title: Optional[str] = None) -> str:
+    """
+    Genera los INSERT SQL como una sola sentencia basada en conjuntos: un INSERT de la lección
+    con RETURNING id, un INSERT multi-fila de clips con RETURNING y un INSERT multi-fila de
+    vocabulario unido por order_index. Evita las subconsultas correlacionadas por fila.
+    """
+    if title is None:
+        title = get_youtube_video_title(video_id)
+    total_duration = get_total_duration(processed_data)
+    thumbnail_url = f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+    clips = processed_data.get('transcript') if isinstance(processed_data.get('transcript'), list) else []
+    
+    use_dictionary = VOCABULARY_STORE == "dictionary"
+    clip_rows = []
+    vocabulary_rows = []
+    for i, clip in enumerate(clips):
+        order_index = i + 1
+        clip_rows.append(
+            f"    ({clip.get('start', 0)}, {clip.get('end', 0)}, {sql_quote(clip.get('text', ''))}, "
+            f"{sql_quote(clip.get('text_translate', ''))}, {order_index})"
+        )
+        if not use_dictionary and isinstance(clip.get('vocabulary'), list):
+            for vocab in clip['vocabulary']:
+                vocabulary_rows.append(
+                    f"    ({order_index}, {sql_quote(vocab.get('original_word', ''))}, "
+                    f"{sql_quote(vocab.get('translation', ''))}, {sql_quote(vocab.get('notes') or None)}::text)"
+                )
+    
+    ctes = [f"""lesson AS (
+    INSERT INTO public.lessons (id, title, language, target_language, youtube_url, youtube_video_id, duration, thumbnail_url, status, created_at, updated_at)
+    VALUES (gen_random_uuid(), {sql_quote(title)}, 'en', 'English', {sql_quote(url)}, {sql_quote(video_id)}, {sql_quote(total_duration)}, {sql_quote(thumbnail_url)}, 'ready', now(), now())
+    RETURNING id
+)"""]
+    final_statement = "SELECT id FROM lesson;"
+    
+    if clip_rows:
+        clip_values = ",\n".join(clip_rows)
+        ctes.append(f"""clip_rows (start_time, end_time, original_text, translated_text, order_index) AS (
+    VALUES
+{clip_values}
+)""")
+        ctes.append("""inserted_clips AS (
+    INSERT INTO public.clips (id, lesson_id, start_time, end_time, original_text, translated_text, order_index, created_at)
+    SELECT gen_random_uuid(), lesson.id, r.start_time, r.end_time, r.original_text, r.translated_text, r.order_index, now()
+    FROM clip_rows r CROSS JOIN lesson
+    RETURNING id, order_index
+)""")
+        final_statement = "SELECT count(*) AS clips FROM inserted_clips;"
+    
+    if vocabulary_rows:
+        vocabulary_values = ",\n".join(vocabulary_rows)
+        ctes.append(f"""vocabulary_rows (order_index, original_word, translation, notes) AS (
+    VALUES
+{vocabulary_values}
+)""")
+        final_statement = """INSERT INTO public.vocabulary (id, clip_id, original_word, translation, notes, created_at)
+SELECT gen_random_uuid(), c.id, v.original_word, v.translation, v.notes, now()
+FROM vocabulary_rows v
+JOIN inserted_clips c ON c.order_index = v.order_index;"""
+    
+    # Modo diccionario: el upsert va en su propia sentencia (antes de la cadena de CTEs) para
+    # que los enlaces puedan referenciar las entradas recién insertadas
+    dictionary_upsert = ""
+    if use_dictionary and clip_rows:
+        entries, links = collect_vocabulary_dictionary(processed_data)
+        if links:
+            dictionary_upsert = generate_dictionary_upsert(entries) + "\n"
+            vocabulary_rows = links
+            final_statement = generate_clip_vocabulary_links(links, "inserted_clips")
+    
+    return f"""BEGIN;{generate_dictionary_schema()}{dictionary_upsert}
+-- Insertar lección, {len(clip_rows)} clips y {len(vocabulary_rows)} entradas de vocabulario en una sola sentencia
+-- Título: {title}
+-- Duración total: {total_duration} segundos (calculada desde end del último clip)
+WITH {", ".join(ctes)}
+{final_statement}
+COMMIT;"""
+
+def clip_content_hash(clip: Dict) -> str:
+    """
+    Clave estable de un clip: hash del contenido original (tiempos y texto), que no cambia
+    al retocar el prompt o la traducción
+    """
+    key = f"{clip.get('start', 0)}|{clip.get('end', 0)}|{clip.get('text', '')}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def vocabulary_content_hash(clip_hash: str, vocab: Dict) -> str:
+    """
+    Clave estable de una entrada de vocabulario: el clip al que pertenece y la palabra normalizada
+    """
+    key = f"{clip_hash}|{vocab.get('original_word', '').strip().lower()}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def index_lesson_content(processed_data: Dict) -> Dict[str, tuple]:
+    """
+    Indexa los clips por su hash de contenido: {hash: (order_index, clip, {hash_vocabulario: vocab})}
+    """
+    indexed = {}
+    clips = processed_data.get('transcript') if isinstance(processed_data.get('transcript'), list) else []
+    for i, clip in enumerate(clips):
+        clip_hash = clip_content_hash(clip)
+        vocabulary = {}
+        for vocab in clip.get('vocabulary') or []:
+            vocabulary[vocabulary_content_hash(clip_hash, vocab)] = vocab
+        indexed[clip_hash] = (i + 1, clip, vocabulary)
+    return indexed
+
+def generate_diff_sql(previous_data: Dict, processed_data: Dict, video_id: str, title: Optional[str] = None) -> str:
+    """
+    Genera solo los UPDATE/INSERT/DELETE necesarios para pasar la lección guardada (previous_data)
+    a la nueva versión (processed_data). Los clips y el vocabulario se emparejan por hash de
+    contenido; en la base de datos el clip se identifica por lección, tiempos y texto original.
+    """
+    lesson_ref = (f"(SELECT l.id FROM public.lessons l WHERE l.youtube_video_id = {sql_quote(video_id)} "
+                  f"ORDER BY l.created_at DESC LIMIT 1)")
+    
+    def clip_match(clip: Dict) -> str:
+        return (f"lesson_id = {lesson_ref} AND start_time = {clip.get('start', 0)} "
+                f"AND end_time = {clip.get('end', 0)} AND original_text = {sql_quote(clip.get('text', ''))}")
+    
+    def clip_ref(clip: Dict) -> str:
+        return f"(SELECT id FROM public.clips WHERE {clip_match(clip)} LIMIT 1)"
+    
+    use_dictionary = VOCABULARY_STORE == "dictionary"
+    dictionary_entries = {}
+    
+    def vocabulary_insert(clip: Dict, vocab: Dict) -> str:
+        if use_dictionary:
+            word_key = vocabulary_word_key(vocab)
+            dictionary_id = vocabulary_dictionary_id(word_key)
+            dictionary_entries[word_key] = (dictionary_id, vocab.get('original_word', ''), vocab.get('translation', ''))
+            return (f"INSERT INTO public.clip_vocabulary (clip_id, dictionary_id, notes, created_at)\n"
+                    f"VALUES ({clip_ref(clip)}, {sql_quote(dictionary_id)}::uuid, {sql_quote(vocab.get('notes') or None)}, now())\n"
+                    f"ON CONFLICT (clip_id, dictionary_id) DO NOTHING;")
+        return (f"INSERT INTO public.vocabulary (id, clip_id, original_word, translation, notes, created_at)\n"
+                f"VALUES (gen_random_uuid(), {clip_ref(clip)}, {sql_quote(vocab.get('original_word', ''))}, "
+                f"{sql_quote(vocab.get('translation', ''))}, {sql_quote(vocab.get('notes') or None)}, now());")
+    
+    def vocabulary_delete(clip: Dict, vocab: Dict) -> str:
+        if use_dictionary:
+            return (f"DELETE FROM public.clip_vocabulary WHERE clip_id = {clip_ref(clip)} "
+                    f"AND dictionary_id = {sql_quote(vocabulary_dictionary_id(vocabulary_word_key(vocab)))}::uuid;")
+        return (f"DELETE FROM public.vocabulary WHERE clip_id = {clip_ref(clip)} "
+                f"AND original_word = {sql_quote(vocab.get('original_word', ''))};")
+    
+    def vocabulary_update(clip: Dict, old_vocab: Dict, vocab: Dict) -> List[str]:
+        if use_dictionary:
+            if vocabulary_word_key(old_vocab) != vocabulary_word_key(vocab):
+                # Otra traducción es otra entrada del diccionario: se cambia el enlace
+                return [vocabulary_delete(clip, old_vocab), vocabulary_insert(clip, vocab)]
+            return [f"UPDATE public.clip_vocabulary SET notes = {sql_quote(vocab.get('notes') or None)} "
+                    f"WHERE clip_id = {clip_ref(clip)} "
+                    f"AND dictionary_id = {sql_quote(vocabulary_dictionary_id(vocabulary_word_key(vocab)))}::uuid;"]
+        return [f"UPDATE public.vocabulary SET translation = {sql_quote(vocab.get('translation', ''))}, "
+                f"notes = {sql_quote(vocab.get('notes') or None)} WHERE clip_id = {clip_ref(clip)} "
+                f"AND original_word = {sql_quote(old_vocab.get('original_word', ''))};"]
+    
+    old = index_lesson_content(previous_data)
+    new = index_lesson_content(processed_data)
+    deletes, updates, inserts = [], [], []
+    counts = {"clips_inserted": 0, "clips_updated": 0, "clips_deleted": 0,
+              "vocabulary_inserted": 0, "vocabulary_updated": 0, "vocabulary_deleted": 0}
+    
+    # 1. Clips que ya no existen (su vocabulario se borra primero)
+    for clip_hash, (order_index, clip, _) in old.items():
+        if clip_hash not in new:
+            vocabulary_table = "public.clip_vocabulary" if use_dictionary else "public.vocabulary"
+            deletes.append(f"-- Eliminar clip {order_index} ({clip_hash})\n"
+                           f"DELETE FROM {vocabulary_table} WHERE clip_id = {clip_ref(clip)};\n"
+                           f"DELETE FROM public.clips WHERE {clip_match(clip)};")
+            counts["clips_deleted"] += 1
+    
+    # 2. Clips que se mantienen: traducción, posición y vocabulario
+    for clip_hash, (order_index, clip, vocabulary) in new.items():
+        if clip_hash not in old:
+            continue
+        old_order_index, old_clip, old_vocabulary = old[clip_hash]
+        if old_order_index != order_index or old_clip.get('text_translate', '') != clip.get('text_translate', ''):
+            updates.append(f"-- Actualizar clip {order_index} ({clip_hash})\n"
+                           f"UPDATE public.clips SET translated_text = {sql_quote(clip.get('text_translate', ''))}, "
+                           f"order_index = {order_index} WHERE {clip_match(clip)};")
+            counts["clips_updated"] += 1
+        for vocab_hash, old_vocab in old_vocabulary.items():
+            if vocab_hash not in vocabulary:
+                deletes.append(vocabulary_delete(clip, old_vocab))
+                counts["vocabulary_deleted"] += 1
+        for vocab_hash, vocab in vocabulary.items():
+            old_vocab = old_vocabulary.get(vocab_hash)
+            if old_vocab is None:
+                inserts.append(vocabulary_insert(clip, vocab))
+                counts["vocabulary_inserted"] += 1
+            elif (old_vocab.get('translation', ''), old_vocab.get('notes') or None) != \
+                    (vocab.get('translation', ''), vocab.get('notes') or None):
+                updates.extend(vocabulary_update(clip, old_vocab, vocab))
+                counts["vocabulary_updated"] += 1
+    
+    # 3. Clips nuevos (después de las actualizaciones, para que su order_index ya sea único)
+    for clip_hash, (order_index, clip, vocabulary) in new.items():
+        if clip_hash not in old:
+            inserts.extend(generate_clip_inserts(clip, order_index, video_id, include_vocabulary=not use_dictionary))
+            if use_dictionary:
+                inserts.extend(vocabulary_insert(clip, vocab) for vocab in vocabulary.values())
+            counts["clips_inserted"] += 1
+            counts["vocabulary_inserted"] += len(vocabulary)
+    
+    # Modo diccionario: un solo upsert con todas las entradas que enlazan los cambios
+    if dictionary_entries:
+        updates.insert(0, generate_dictionary_upsert(dictionary_entries))
+    
+    summary = ", ".join(f"{name}={value}" for name, value in counts.items())
+    if not (deletes or updates or inserts):
+        return f"-- Sin cambios respecto de la versión guardada de {video_id}"
+    
+    lesson_update = []
+    total_duration = get_total_duration(processed_data)
+    if total_duration != get_total_duration(previous_data):
+        lesson_update.append(f"UPDATE public.lessons SET duration = {sql_quote(total_duration)}, updated_at = now() "
+                             f"WHERE id = {lesson_ref};")
+    else:
+        lesson_update.append(f"UPDATE public.lessons SET updated_at = now() WHERE id = {lesson_ref};")
+    
+    return "\n".join([
+        "BEGIN;" + generate_dictionary_schema(),
+        f"-- Cambios incrementales de la lección {video_id}" + (f" ({title})" if title else ""),
+        f"-- {summary}",
+        *deletes, *updates, *inserts, *lesson_update,
+        "COMMIT;"
+    ])
+
+def build_lesson_rows(processed_data: Dict, video_id: str, url: str, title: str) -> tuple:
+    """
+    Convierte los datos procesados en filas (lección, clips, vocabulario) con UUIDs generados
+    localmente, para cargarlas con sentencias parametrizadas sin depender de RETURNING
+    """
+    now = datetime.now(timezone.utc)
+    lesson_id = str(uuid.uuid4())
+    lesson = (
+        lesson_id, title, "en", "English", url, video_id, get_total_duration(processed_data),
+        f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg", "ready", now, now
+    )
+    clip_rows = []
+    vocabulary_rows = []
+    clips = processed_data.get('transcript') if isinstance(processed_data.get('transcript'), list) else []
+    for i, clip in enumerate(clips):
+        clip_id = str(uuid.uuid4())
+        clip_rows.append((
+            clip_id, lesson_id, clip.get('start', 0), clip.get('end', 0),
+            clip.get('text', ''), clip.get('text_translate', ''), i + 1, now
+        ))
+        if isinstance(clip.get('vocabulary'), list):
+            for vocab in clip['vocabulary']:
+                vocabulary_rows.append((
+                    str(uuid.uuid4()), clip_id, vocab.get('original_word', ''),
+                    vocab.get('translation', ''), vocab.get('notes') or None, now
+                ))
+    return lesson, clip_rows, vocabulary_rows
+
+def build_dictionary_rows(processed_data: Dict, clip_rows: List[tuple]) -> tuple:
+    """
+    Convierte el vocabulario en filas del diccionario (deduplicadas) y enlaces clip-vocabulario
+    para los clips generados por build_lesson_rows
+    """
+    now = datetime.now(timezone.utc)
+    entries, links = collect_vocabulary_dictionary(processed_data)
+    clip_ids = {row[6]: row[0] for row in clip_rows}
+    dictionary_rows = [
+        (dictionary_id, word_key, original_word, translation, now)
+        for word_key, (dictionary_id, original_word, translation) in entries.items()
+    ]
+    link_rows = [(clip_ids[order_index], dictionary_id, notes, now) for order_index, dictionary_id, notes in links]
+    return dictionary_rows, link_rows
+
+LESSON_COLUMNS = "id, title, language, target_language, youtube_url, youtube_video_id, duration, thumbnail_url, status, created_at, updated_at"
+CLIP_COLUMNS = "id, lesson_id, start_time, end_time, original_text, translated_text, order_index, created_at"
+VOCABULARY_COLUMNS = "id, clip_id, original_word, translation, notes, created_at"
+DICTIONARY_COLUMNS = "id, word_key, original_word, translation, created_at"
+CLIP_VOCABULARY_COLUMNS = "clip_id, dictionary_id, notes, created_at"
+
+class LessonWriter(ABC):
+    """
+    Carga una lección procesada directamente en la base de datos en una sola transacción
+    y devuelve métricas de la carga (filas, tiempo de transacción y filas por segundo)
+    """
+    backend = ""
+
+    def write(self, processed_data: Dict, video_id: str, url: str, title: str) -> Dict[str, Any]:
+        lesson, clip_rows, vocabulary_rows = build_lesson_rows(processed_data, video_id, url, title)
+        dictionary_rows, link_rows = [], []
+        if VOCABULARY_STORE == "dictionary":
+            dictionary_rows, link_rows = build_dictionary_rows(processed_data, clip_rows)
+            vocabulary_rows = []
+        start = time.perf_counter()
+        self._write_rows(lesson, clip_rows, vocabulary_rows, dictionary_rows, link_rows)
+        elapsed = time.perf_counter() - start
+        total_rows = 1 + len(clip_rows) + len(vocabulary_rows) + len(dictionary_rows) + len(link_rows)
+        print(f"[debug-server] Loaded lesson {lesson[0]} ({total_rows} rows) into {self.backend} in {elapsed:.3f}s")
+        rows = {"lessons": 1, "clips": len(clip_rows), "vocabulary": len(vocabulary_rows)}
+        if VOCABULARY_STORE == "dictionary":
+            # vocabulary_dictionary cuenta las filas enviadas; las ya existentes se ignoran en el upsert
+            rows.update({"vocabulary_dictionary": len(dictionary_rows), "clip_vocabulary": len(link_rows)})
+        return {
+            "backend": self.backend,
+            "lesson_id": lesson[0],
+            "rows": rows,
+            "transaction_seconds": round(elapsed, 4),
+            "rows_per_second": round(total_rows / elapsed, 1) if elapsed > 0 else None
+        }
+
+    @abstractmethod
+    def _write_rows(self, lesson: tuple, clip_rows: List[tuple], vocabulary_rows: List[tuple],
+                    dictionary_rows: List[tuple], link_rows: List[tuple]):
+        pass
+
+    def close(self):
+        pass
+
+class PostgresLessonWriter(LessonWriter):
+    """
+    Carga con un pool de conexiones psycopg: INSERT parametrizado de la lección y COPY
+    de clips y vocabulario
+    """
+    backend = "postgresql"
+
+    def __init__(self, database_url: str, min_size: int, max_size: int):
+        try:
+            from psycopg_pool import ConnectionPool
+        except ImportError:
+            raise RuntimeError("psycopg[pool] is required to write lessons to PostgreSQL")
+        self.pool = ConnectionPool(database_url, min_size=min_size, max_size=max_size, open=True)
+        if VOCABULARY_STORE == "dictionary":
+            with self.pool.connection() as conn:
+                conn.execute(VOCABULARY_DICTIONARY_SCHEMA)
+
+    def _write_rows(self, lesson: tuple, clip_rows: List[tuple], vocabulary_rows: List[tuple],
+                    dictionary_rows: List[tuple], link_rows: List[tuple]):
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                with conn.cursor() as cursor:
+                    cursor.execute(f"INSERT INTO public.lessons ({LESSON_COLUMNS}) VALUES ({', '.join(['%s'] * 11)})", lesson)
+                    with cursor.copy(f"COPY public.clips ({CLIP_COLUMNS}) FROM STDIN") as copy:
+                        for row in clip_rows:
+                            copy.write_row(row)
+                    if vocabulary_rows:
+                        with cursor.copy(f"COPY public.vocabulary ({VOCABULARY_COLUMNS}) FROM STDIN") as copy:
+                            for row in vocabulary_rows:
+                                copy.write_row(row)
+                    if dictionary_rows:
+                        # COPY no admite ON CONFLICT: el diccionario se carga con un executemany en pipeline
+                        cursor.executemany(
+                            f"INSERT INTO public.vocabulary_dictionary ({DICTIONARY_COLUMNS}) VALUES (%s, %s, %s, %s, %s) "
+                            "ON CONFLICT (word_key) DO NOTHING",
+                            dictionary_rows
+                        )
+                    if link_rows:
+                        with cursor.copy(f"COPY public.clip_vocabulary ({CLIP_VOCABULARY_COLUMNS}) FROM STDIN") as copy:
+                            for row in link_rows:
+                                copy.write_row(row)
+
+    def close(self):
+        self.pool.close()
+
+class SQLiteLessonWriter(LessonWriter):
+    """
+    Carga en un archivo SQLite local (crea las tablas si no existen), para pruebas
+    """
+    backend = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS lessons (
+                    id TEXT PRIMARY KEY, title TEXT, language TEXT, target_language TEXT, youtube_url TEXT,
+                    youtube_video_id TEXT, duration TEXT, thumbnail_url TEXT, status TEXT,
+                    created_at TIMESTAMP, updated_at TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS clips (
+                    id TEXT PRIMARY KEY, lesson_id TEXT REFERENCES lessons (id), start_time REAL, end_time REAL,
+                    original_text TEXT, translated_text TEXT, order_index INTEGER, created_at TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS vocabulary (
+                    id TEXT PRIMARY KEY, clip_id TEXT REFERENCES clips (id), original_word TEXT,
+                    translation TEXT, notes TEXT, created_at TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS vocabulary_dictionary (
+                    id TEXT PRIMARY KEY, word_key TEXT NOT NULL UNIQUE, original_word TEXT NOT NULL,
+                    translation TEXT NOT NULL, created_at TIMESTAMP
+                );
+                CREATE TABLE IF NOT EXISTS clip_vocabulary (
+                    clip_id TEXT REFERENCES clips (id), dictionary_id TEXT REFERENCES vocabulary_dictionary (id),
+                    notes TEXT, created_at TIMESTAMP, PRIMARY KEY (clip_id, dictionary_id)
+                );
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _write_rows(self, lesson: tuple, clip_rows: List[tuple], vocabulary_rows: List[tuple],
+                    dictionary_rows: List[tuple], link_rows: List[tuple]):
+        def to_sqlite(row: tuple) -> tuple:
+            return tuple(value.isoformat() if isinstance(value, datetime) else value for value in row)
+        
+        with self._connect() as conn:
+            conn.execute(f"INSERT INTO lessons ({LESSON_COLUMNS}) VALUES ({', '.join(['?'] * 11)})", to_sqlite(lesson))
+            conn.executemany(f"INSERT INTO clips ({CLIP_COLUMNS}) VALUES ({', '.join(['?'] * 8)})", [to_sqlite(row) for row in clip_rows])
+            conn.executemany(f"INSERT INTO vocabulary ({VOCABULARY_COLUMNS}) VALUES ({', '.join(['?'] * 6)})", [to_sqlite(row) for row in vocabulary_rows])
+            conn.executemany(f"INSERT OR IGNORE INTO vocabulary_dictionary ({DICTIONARY_COLUMNS}) VALUES (?, ?, ?, ?, ?)", [to_sqlite(row) for row in dictionary_rows])
+            conn.executemany(f"INSERT INTO clip_vocabulary ({CLIP_VOCABULARY_COLUMNS}) VALUES (?, ?, ?, ?)", [to_sqlite(row) for row in link_rows])
+
+lesson_writer = None
+lesson_writer_lock = threading.Lock()
+
+def get_lesson_writer() -> LessonWriter:
+    """
+    Devuelve el writer configurado en LESSONS_DATABASE_URL (postgresql://... o sqlite:///ruta.db)
+    """
+    global lesson_writer
+    with lesson_writer_lock:
+        if lesson_writer is not None:
+            return lesson_writer
+        database_url = os.getenv("LESSONS_DATABASE_URL")
+        if not database_url:
+            raise ValueError("LESSONS_DATABASE_URL not set in environment variables")
+        if database_url.startswith("sqlite:///"):
+            lesson_writer = SQLiteLessonWriter(database_url[len("sqlite:///"):])
+        else:
+            lesson_writer = PostgresLessonWriter(
+                database_url,
+                min_size=int(os.getenv("LESSONS_DATABASE_POOL_MIN", 1)),
+                max_size=int(os.getenv("LESSONS_DATABASE_POOL_MAX", 5))
+            )
+        return lesson_writer
+
 @app.post("/process-transcript", response_model=ProcessTranscriptResponse)
 async def process_transcript_endpoint(request: ProcessTranscriptRequest, _: None = Depends(verify_api_key)):
     """
     Procesa una transcripción de YouTube y genera INSERT SQL para la base de datos
     """
+    if request.sql_format == "diff" and request.write_to_database:
+        raise HTTPException(status_code=400, detail="sql_format='diff' cannot be combined with write_to_database.")
     try:
         print(f"[debug-server] process_transcript({request.url}, {request.prompt})")
         
-        result = await process_transcript_and_generate_sql(request.url, request.prompt)
+        result = await process_transcript_and_generate_sql(
+            request.url, request.prompt, request.target_language, request.sql_format,
+            request.write_to_database, request.force_refresh
+        )
         
         return result
         
@@ -485,6 +2071,388 @@ async def process_transcript_endpoint(request: ProcessTranscriptRequest, _: None
         print(f"[debug-server] Error processing transcript: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing transcript: {str(e)}")
 
+@app.delete("/process-transcript/cache/{video_id}")
+async def invalidate_process_transcript_cache(video_id: str, include_transcript: bool = False,
+                                              _: None = Depends(verify_api_key)):
+    """
+    Invalida los resultados guardados de /process-transcript para un video.
+    Con include_transcript=true también elimina la transcripción en caché.
+    """
+    deleted = await run_blocking(processed_result_cache.invalidate, video_id)
+    if include_transcript:
+        await run_blocking(transcript_cache.invalidate, video_id)
+    print(f"[debug-server] invalidated {deleted} processed results for {video_id}")
+    return {"video_id": video_id, "deleted_results": deleted, "transcript_invalidated": include_transcript}
+
+@app.post("/process-transcript/snapshot/{video_id}/ack")
+async def acknowledge_lesson_snapshot(video_id: str, version: str, _: None = Depends(verify_api_key)):
+    """
+    Confirma que el SQL generado para la versión `version` (stats.snapshot_version) se aplicó
+    en la base de datos: los próximos sql_format="diff" se calculan contra esa versión
+    """
+    if not await run_blocking(lesson_snapshots.acknowledge, video_id, version):
+        raise HTTPException(status_code=404, detail="Pending lesson version not found")
+    print(f"[debug-server] acknowledged lesson version {version} for {video_id}")
+    return {"video_id": video_id, "version": version, "status": "stored"}
+
+@app.post("/process-transcript/stream")
+async def process_transcript_stream_endpoint(request: ProcessTranscriptStreamRequest, _: None = Depends(verify_api_key)):
+    """
+    Procesa una transcripción de YouTube en modo streaming (NDJSON).
+    Emite un evento 'lesson' con el INSERT de la lección, un evento 'clip' con el clip
+    procesado y sus INSERT en cuanto la IA lo termina, y un evento final 'done'.
+    Concatenando los campos 'sql' en orden se obtiene el script completo.
+    """
+    print(f"[debug-server] process_transcript_stream({request.url}, {request.prompt})")
+    
+    video_id = get_video_id(request.url)
+    if not video_id:
+        raise HTTPException(status_code=400, detail="Invalid YouTube URL. Could not extract video ID.")
+    
+    def event(data: Dict) -> str:
+        return json.dumps(data, ensure_ascii=False) + "\n"
+    
+    async def event_stream():
+        try:
+            transcript, metadata = await asyncio.gather(
+                run_blocking(fetch_transcript, video_id),
+                video_metadata.get(video_id)
+            )
+            title = metadata["title"]
+            clips = group_transcript_segments(transcript["data"])
+            total_duration = str(int(clips[-1]['end'])) if clips else "0"
+            yield event({
+                "event": "lesson",
+                "video_id": video_id,
+                "title": title,
+                "clips": len(clips),
+                "sql": "BEGIN;" + generate_dictionary_schema() + "\n" + generate_lesson_insert(video_id, request.url, title, total_duration)
+            })
+            
+            stats = {}
+            async for i, translation in stream_clip_translations(clips, request.prompt, request.target_language, stats):
+                clip = {**clips[i], **translation}
+                statements = generate_clip_inserts(clip, i + 1, video_id, include_vocabulary=VOCABULARY_STORE != "dictionary")
+                if VOCABULARY_STORE == "dictionary":
+                    entries, links = collect_vocabulary_dictionary({"transcript": [clip]})
+                    if links:
+                        links = [(i + 1, dictionary_id, notes) for _, dictionary_id, notes in links]
+                        statements.append(generate_dictionary_upsert(entries))
+                        statements.append(generate_clip_vocabulary_links(links, latest_lesson_clips_sql(video_id)))
+                yield event({
+                    "event": "clip",
+                    "index": i,
+                    "clip": clip,
+                    "sql": "\n".join(statements)
+                })
+            
+            yield event({"event": "done", "stats": stats, "sql": "COMMIT;"})
+        except Exception as e:
+            print(f"[debug-server] Error streaming transcript: {str(e)}")
+            yield event({"event": "error", "detail": f"Error processing transcript: {str(e)}"})
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+def get_playlist_video_ids(playlist_id: str) -> List[str]:
+    """
+    Obtiene los video_id de una playlist de YouTube desde la página pública de la playlist
+    (solo los videos incluidos en la carga inicial de la página, hasta ~100)
+    """
+    url = f"https://www.youtube.com/playlist?list={playlist_id}"
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+    response = requests.get(url, headers=headers, timeout=15)
+    response.raise_for_status()
+    video_ids = []
+    for video_id in re.findall(r'"playlistVideoRenderer":\{"videoId":"([\w-]{11})"', response.text):
+        if video_id not in video_ids:
+            video_ids.append(video_id)
+    if not video_ids:
+        raise ValueError(f"No videos found in playlist {playlist_id}")
+    return video_ids
+
+class BatchJobStore:
+    """
+    Persistencia en SQLite de los lotes de transcripciones y del progreso de cada video,
+    para poder retomar un lote después de una caída del servidor
+    """
+    def __init__(self):
+        with get_cache_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    id TEXT PRIMARY KEY,
+                    prompt TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    sql_format TEXT NOT NULL,
+                    write_to_database INTEGER NOT NULL,
+                    force_refresh INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_job_videos (
+                    batch_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    url TEXT NOT NULL,
+                    video_id TEXT,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    timings TEXT NOT NULL,
+                    processed_data TEXT,
+                    sql_inserts TEXT,
+                    stats TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (batch_id, position)
+                )""")
+
+    def create(self, request: BatchJobRequest, urls: List[str]) -> str:
+        batch_id = str(uuid.uuid4())
+        now = time.time()
+        with get_cache_connection() as conn:
+            conn.execute(
+                "INSERT INTO batch_jobs (id, prompt, target_language, sql_format, write_to_database, force_refresh, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'running', ?, ?)",
+                (batch_id, request.prompt, request.target_language, request.sql_format,
+                 int(request.write_to_database), int(request.force_refresh), now, now)
+            )
+            conn.executemany(
+                "INSERT INTO batch_job_videos (batch_id, position, url, video_id, status, timings, updated_at) "
+                "VALUES (?, ?, ?, ?, 'pending', '{}', ?)",
+                [(batch_id, position, url, get_video_id(url), now) for position, url in enumerate(urls)]
+            )
+        return batch_id
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with get_cache_connection() as conn:
+            row = conn.execute(
+                "SELECT id, prompt, target_language, sql_format, write_to_database, force_refresh, status, created_at, updated_at "
+                "FROM batch_jobs WHERE id = ?",
+                (batch_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0], "prompt": row[1], "target_language": row[2], "sql_format": row[3],
+            "write_to_database": bool(row[4]), "force_refresh": bool(row[5]), "status": row[6],
+            "created_at": row[7], "updated_at": row[8]
+        }
+
+    def get_videos(self, batch_id: str, include_results: bool = False) -> List[Dict[str, Any]]:
+        with get_cache_connection() as conn:
+            rows = conn.execute(
+                "SELECT position, url, video_id, status, error, timings, processed_data, sql_inserts, stats "
+                "FROM batch_job_videos WHERE batch_id = ? ORDER BY position",
+                (batch_id,)
+            ).fetchall()
+        videos = []
+        for row in rows:
+            video = {
+                "position": row[0], "url": row[1], "video_id": row[2], "status": row[3],
+                "error": row[4], "timings": json.loads(row[5])
+            }
+            if include_results:
+                video["processed_data"] = json.loads(row[6]) if row[6] else None
+                video["sql_inserts"] = row[7]
+                video["stats"] = json.loads(row[8]) if row[8] else None
+            videos.append(video)
+        return videos
+
+    def update_video(self, batch_id: str, position: int, **fields):
+        """
+        Actualiza campos de un video del lote (los dict se guardan como JSON)
+        """
+        columns = []
+        values = []
+        for column, value in fields.items():
+            columns.append(f"{column} = ?")
+            values.append(json.dumps(value, ensure_ascii=False) if isinstance(value, dict) else value)
+        columns.append("updated_at = ?")
+        values.extend([time.time(), batch_id, position])
+        with get_cache_connection() as conn:
+            conn.execute(f"UPDATE batch_job_videos SET {', '.join(columns)} WHERE batch_id = ? AND position = ?", values)
+
+    def set_status(self, batch_id: str, status: str):
+        with get_cache_connection() as conn:
+            conn.execute("UPDATE batch_jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), batch_id))
+
+    def running_batches(self) -> List[str]:
+        with get_cache_connection() as conn:
+            return [row[0] for row in conn.execute("SELECT id FROM batch_jobs WHERE status = 'running'").fetchall()]
+
+batch_job_store = BatchJobStore()
+
+# Límites de concurrencia por etapa, compartidos por todos los lotes
+batch_stage_semaphores = {
+    "transcript": asyncio.Semaphore(int(os.getenv("BATCH_TRANSCRIPT_CONCURRENCY", 4))),
+    "process": asyncio.Semaphore(int(os.getenv("BATCH_LLM_CONCURRENCY", 2))),
+    "sql": asyncio.Semaphore(int(os.getenv("BATCH_SQL_CONCURRENCY", 4)))
+}
+
+# Tareas de los lotes en ejecución (evita ejecutar dos veces el mismo lote)
+batch_tasks: Dict[str, asyncio.Task] = {}
+
+async def run_batch_video(batch: Dict[str, Any], video: Dict[str, Any]):
+    """
+    Procesa un video del lote por etapas (transcripción, IA, SQL), cada una con su propio
+    límite de concurrencia. Guarda el progreso tras cada etapa: al retomar, un video que ya
+    pasó por la IA continúa directamente con la generación de SQL.
+    """
+    batch_id = batch["id"]
+    position = video["position"]
+    video_id = video["video_id"]
+    url = video["url"]
+    timings = video["timings"]
+    store = batch_job_store
+    
+    try:
+        if not video_id:
+            raise ValueError("Invalid YouTube URL. Could not extract video ID.")
+        
+        prompt_hash = ProcessedResultCache.prompt_hash(batch["prompt"], batch["target_language"])
+        processed_data = video.get("processed_data")
+        stats = {"result_cache": "refresh" if batch["force_refresh"] else "miss"}
+        
+        if processed_data is None and not batch["force_refresh"]:
+            cached = await run_blocking(processed_result_cache.get, video_id, prompt_hash, TRANSCRIPT_MODEL)
+            if cached is not None:
+                processed_data = cached["processed_data"]
+                stats = {"result_cache": "hit"}
+        
+        if processed_data is None:
+            async with batch_stage_semaphores["transcript"]:
+                await run_blocking(store.update_video, batch_id, position, status="fetching_transcript")
+                start = time.perf_counter()
+                transcript = await run_blocking(fetch_transcript, video_id)
+                timings["transcript"] = round(time.perf_counter() - start, 3)
+            
+            async with batch_stage_semaphores["process"]:
+                await run_blocking(store.update_video, batch_id, position, status="processing", timings=timings)
+                start = time.perf_counter()
+                processed_data = await process_transcript_with_ai(
+                    transcript["data"], batch["prompt"], video_id, url, batch["target_language"], stats,
+                    batch["force_refresh"]
+                )
+                timings["process"] = round(time.perf_counter() - start, 3)
+            await run_blocking(store.update_video, batch_id, position, status="processed",
+                               timings=timings, processed_data=processed_data)
+        
+        async with batch_stage_semaphores["sql"]:
+            await run_blocking(store.update_video, batch_id, position, status="generating_sql")
+            start = time.perf_counter()
+            title = (await video_metadata.get(video_id))["title"]
+            response = await build_process_transcript_response(
+                processed_data, video_id, url, title, batch["sql_format"], batch["write_to_database"], stats
+            )
+            await run_blocking(
+                processed_result_cache.set, video_id, prompt_hash, TRANSCRIPT_MODEL, title,
+                processed_data, batch["sql_format"], VOCABULARY_STORE, response.sql_inserts
+            )
+            timings["sql"] = round(time.perf_counter() - start, 3)
+        
+        await run_blocking(store.update_video, batch_id, position, status="done", error=None, timings=timings,
+                           processed_data=processed_data, sql_inserts=response.sql_inserts, stats=response.stats)
+    except Exception as e:
+        print(f"[debug-server] Batch {batch_id} video {position} failed: {str(e)}")
+        await run_blocking(store.update_video, batch_id, position, status="failed", error=str(e), timings=timings)
+
+async def run_batch_job(batch_id: str):
+    """
+    Ejecuta (o retoma) todos los videos pendientes de un lote
+    """
+    try:
+        batch = await run_blocking(batch_job_store.get_batch, batch_id)
+        videos = await run_blocking(batch_job_store.get_videos, batch_id, True)
+        pending = [video for video in videos if video["status"] != "done"]
+        print(f"[debug-server] Running batch {batch_id}: {len(pending)} of {len(videos)} videos pending")
+        
+        # Precargar en una sola consulta por lotes los metadatos de todos los videos pendientes
+        await video_metadata.get_many([video["video_id"] for video in pending if video["video_id"]])
+        
+        await asyncio.gather(*(run_batch_video(batch, video) for video in pending))
+        
+        videos = await run_blocking(batch_job_store.get_videos, batch_id)
+        failed = sum(1 for video in videos if video["status"] == "failed")
+        await run_blocking(batch_job_store.set_status, batch_id, "completed_with_errors" if failed else "completed")
+    finally:
+        batch_tasks.pop(batch_id, None)
+
+def start_batch_job(batch_id: str):
+    if batch_id not in batch_tasks:
+        batch_tasks[batch_id] = asyncio.create_task(run_batch_job(batch_id))
+
+def summarize_batch(batch: Dict[str, Any], videos: List[Dict[str, Any]]) -> Dict[str, Any]:
+    counts = {}
+    for video in videos:
+        counts[video["status"]] = counts.get(video["status"], 0) + 1
+    return {
+        "batch_id": batch["id"],
+        "status": batch["status"],
+        "total": len(videos),
+        "counts": counts,
+        "created_at": batch["created_at"],
+        "updated_at": batch["updated_at"],
+        "videos": videos
+    }
+
+@app.post("/batch-jobs")
+async def create_batch_job(request: BatchJobRequest, _: None = Depends(verify_api_key)):
+    """
+    Crea un lote de procesamiento de transcripciones a partir de una lista de URLs
+    y/o una playlist de YouTube, y lo ejecuta en segundo plano
+    """
+    if request.sql_format == "diff" and request.write_to_database:
+        raise HTTPException(status_code=400, detail="sql_format='diff' cannot be combined with write_to_database.")
+    urls = list(request.urls)
+    if request.playlist_id:
+        try:
+            video_ids = await run_blocking(get_playlist_video_ids, request.playlist_id)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error reading playlist: {str(e)}")
+        urls.extend(f"https://www.youtube.com/watch?v={video_id}" for video_id in video_ids)
+    if not urls:
+        raise HTTPException(status_code=400, detail="Provide at least one URL or a playlist_id.")
+    
+    batch_id = await run_blocking(batch_job_store.create, request, urls)
+    print(f"[debug-server] Created batch {batch_id} with {len(urls)} videos")
+    start_batch_job(batch_id)
+    return {"batch_id": batch_id, "status": "running", "total": len(urls)}
+
+@app.get("/batch-jobs/{batch_id}")
+async def get_batch_job(batch_id: str, _: None = Depends(verify_api_key)):
+    """
+    Devuelve el estado del lote y el estado y tiempos por etapa de cada video
+    """
+    batch = await run_blocking(batch_job_store.get_batch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    videos = await run_blocking(batch_job_store.get_videos, batch_id)
+    return summarize_batch(batch, videos)
+
+@app.get("/batch-jobs/{batch_id}/videos/{position}")
+async def get_batch_job_video(batch_id: str, position: int, _: None = Depends(verify_api_key)):
+    """
+    Devuelve el resultado (datos procesados y SQL) de un video del lote
+    """
+    videos = await run_blocking(batch_job_store.get_videos, batch_id, True)
+    for video in videos:
+        if video["position"] == position:
+            return video
+    raise HTTPException(status_code=404, detail="Batch job video not found")
+
+@app.post("/batch-jobs/{batch_id}/resume")
+async def resume_batch_job(batch_id: str, _: None = Depends(verify_api_key)):
+    """
+    Retoma un lote: vuelve a ejecutar los videos que no terminaron (incluidos los fallidos)
+    """
+    batch = await run_blocking(batch_job_store.get_batch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    await run_blocking(batch_job_store.set_status, batch_id, "running")
+    start_batch_job(batch_id)
+    return {"batch_id": batch_id, "status": "running"}
+
 @app.get("/")
 async def root():
     """
@@ -497,19 +2465,41 @@ async def root():
             "crawl": "/crawl - POST - Crawl a website",
             "browser_agent": "/browser-agent - POST - Run browser agent",
             "youtube_transcript": "/youtube-transcript - POST - Extract YouTube video transcript",
-            "process_transcript": "/process-transcript - POST - Process transcript and generate SQL inserts"
+            "process_transcript": "/process-transcript - POST - Process transcript and generate SQL inserts",
+            "process_transcript_stream": "/process-transcript/stream - POST - Process transcript streaming clips and SQL as NDJSON",
+            "process_transcript_cache": "/process-transcript/cache/{video_id} - DELETE - Invalidate cached transcript results",
+            "process_transcript_snapshot_ack": "/process-transcript/snapshot/{video_id}/ack - POST - Confirm the generated SQL was applied (base for diff SQL)",
+            "batch_jobs": "/batch-jobs - POST - Process a list of videos or a playlist in the background",
+            "batch_job_status": "/batch-jobs/{batch_id} - GET - Batch status with per-video status and timings"
         }
     }
 
+@app.on_event("startup")
+async def startup_event():
+    """Resume batch jobs that were running when the server stopped"""
+    if os.getenv("BATCH_RESUME_ON_STARTUP", "true").lower() == "true":
+        for batch_id in await run_blocking(batch_job_store.running_batches):
+            print(f"[debug-server] Resuming batch {batch_id}")
+            start_batch_job(batch_id)
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources when the server shuts down"""
     global crawler
     if crawler:
         await crawler.close()
+    if lesson_writer:
+        lesson_writer.close()
+    await video_metadata.close()
+    io_executor.shutdown(wait=False)
 
 if __name__ == "__main__":
     # Get host and port from environment variables with defaults
     host = os.getenv("SERVER_HOST", "0.0.0.0")
     port = int(os.getenv("SERVER_PORT", 8000))
-    uvicorn.run("main:app", host=host, port=port)
\ No newline at end of file
+    # SERVER_UDS: listen on a Unix domain socket instead (for a QA client on the same machine)
+    uds = os.getenv("SERVER_UDS")
+    if uds:
+        uvicorn.run("main:app", uds=uds)
+    else:
+        uvicorn.run("main:app", host=host, port=port)
\ No newline at end of file
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for batch transcript jobs, with stand-in transcript, metadata and LLM stages
+"""
+
+import asyncio
+import os
+import tempfile
+from unittest.mock import patch
+
+# Scratch cache database for the batch job store (when this is the first test to import server.main;
+# the video ids below are not used by the other tests sharing the database)
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test_cache.db")
+
+import server.main as server
+from server.main import BatchJobRequest, create_batch_job, get_batch_job, get_batch_job_video, resume_batch_job
+
+VIDEO_URLS = [f"https://www.youtube.com/watch?v=batchvideo{i}" for i in range(3)]
+FLAKY_VIDEO = "batchvideo1"
+
+transcript_calls = []
+process_calls = []
+
+def fake_fetch_transcript(video_id):
+    transcript_calls.append(video_id)
+    # The flaky video fails the first time, as if the server had lost the connection
+    if video_id == FLAKY_VIDEO and transcript_calls.count(video_id) == 1:
+        raise RuntimeError("transcript service unavailable")
+    return {"data": [{"text": f"Hello from {video_id}.", "start": 0.0, "duration": 2.0}]}
+
+async def fake_process_transcript_with_ai(transcript_data, prompt, video_id, url, target_language="es",
+                                          stats=None, force_refresh=False):
+    process_calls.append(video_id)
+    return {
+        "transcript": [{
+            "text": transcript_data[0]["text"], "start": 0.0, "end": 2.0,
+            "text_translate": f"Hola desde {video_id}.",
+            "vocabulary": [{"original_word": "hello", "translation": "hola", "notes": None}]
+        }],
+        "video_id": video_id,
+        "url": url,
+        "language": "en"
+    }
+
+async def fake_metadata_get(video_id):
+    return {"title": f"Lesson {video_id}", "author": "Teacher", "duration": None}
+
+async def fake_metadata_get_many(video_ids):
+    return {video_id: await fake_metadata_get(video_id) for video_id in video_ids}
+
+def stand_in_stages():
+    return [
+        patch.object(server, "fetch_transcript", fake_fetch_transcript),
+        patch.object(server, "process_transcript_with_ai", fake_process_transcript_with_ai),
+        patch.object(server.video_metadata, "get", fake_metadata_get),
+        patch.object(server.video_metadata, "get_many", fake_metadata_get_many)
+    ]
+
+async def run_batch():
+    request = BatchJobRequest(urls=VIDEO_URLS, prompt="Translate for learners")
+    created = await create_batch_job(request, None)
+    batch_id = created["batch_id"]
+    assert created["total"] == 3
+    await server.batch_tasks[batch_id]
+
+    status = await get_batch_job(batch_id, None)
+    assert status["status"] == "completed_with_errors"
+    assert status["counts"] == {"done": 2, "failed": 1}
+    assert "transcript service unavailable" in status["videos"][1]["error"]
+    print(f"✅ First run: {status['counts']}")
+
+    await resume_batch_job(batch_id, None)
+    await server.batch_tasks[batch_id]
+    status = await get_batch_job(batch_id, None)
+    assert status["status"] == "completed"
+    assert status["counts"] == {"done": 3}
+    # Only the failed video goes through the transcript and LLM stages again
+    assert sorted(process_calls) == ["batchvideo0", "batchvideo1", "batchvideo2"]
+    assert transcript_calls.count(FLAKY_VIDEO) == 2
+    print("✅ Resume only re-ran the failed video")
+
+    video = await get_batch_job_video(batch_id, 1, None)
+    assert video["processed_data"]["transcript"][0]["text_translate"] == f"Hola desde {FLAKY_VIDEO}."
+    assert "INSERT INTO public.lessons" in video["sql_inserts"]
+    assert set(video["timings"]) >= {"transcript", "process", "sql"}
+    print("✅ Per-video results include processed data, SQL and stage timings")
+
+def test_batch_job_resume():
+    patches = stand_in_stages()
+    for stand_in in patches:
+        stand_in.start()
+    try:
+        asyncio.run(run_batch())
+    finally:
+        for stand_in in patches:
+            stand_in.stop()
+
+if __name__ == "__main__":
+    print("🚀 Iniciando prueba de lotes de transcripciones...")
+    test_batch_job_resume()
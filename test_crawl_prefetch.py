@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script for the QA agent crawl prefetch: a failed prefetch falls back to a real crawl
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# Configure the client module before importing it
+scratch = tempfile.mkdtemp()
+os.environ["OPENAI_API_KEY"] = "test-key"
+os.environ.setdefault("QA_API_KEY", "test-server-key")
+os.environ.setdefault("QA_API_KEY_CLIENT", "test-client-key")
+os.environ.setdefault("MONITOR_DB_PATH", os.path.join(scratch, "qa_monitors.db"))
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "client"))
+from main import QAAgent, QARunContext, SharedCrawls, current_run
+
+URL = "https://example.com/store"
+crawls = []
+
+async def flaky_fetch_crawl(url):
+    crawls.append(url)
+    await asyncio.sleep(0)
+    if len(crawls) == 1:
+        raise RuntimeError("crawler unavailable")
+    return {"markdown_content": "# Welcome to our store"}
+
+async def run_prefetch_then_crawl():
+    os.environ["CRAWL_PREFETCH_ENABLED"] = "true"
+    agent = QAAgent()
+    agent.fetch_crawl = flaky_fetch_crawl
+    run = QARunContext(SharedCrawls())
+    token = current_run.set(run)
+    try:
+        agent.start_prefetch(run, f"Check the spelling of {URL}")
+        # The speculative crawl fails before the agent asks for the page
+        await asyncio.gather(*run.prefetched.values(), return_exceptions=True)
+        result = await agent.crawl_website(URL)
+        prefetch = agent.finish_prefetch(run)
+    finally:
+        current_run.reset(token)
+        await agent.close()
+    return run, result, prefetch
+
+def test_failed_prefetch_crawls_again():
+    run, result, prefetch = asyncio.run(run_prefetch_then_crawl())
+
+    assert result.startswith(f"Successfully crawled {URL}"), result
+    assert "# Welcome to our store" in result
+    assert crawls == [URL, URL]
+    print("✅ The planned crawl runs again after the prefetch failed")
+
+    assert prefetch == {"started": 1, "used": 1, "wasted": 0}
+    assert run.shared_crawls.stats()["requests"] == 2
+    print(f"✅ Prefetch stats: {prefetch}")
+
+if __name__ == "__main__":
+    print("🚀 Starting crawl prefetch test...")
+    test_failed_prefetch_crawls_again()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script for the incremental diff SQL and the stored lesson version it is based on
+"""
+
+import asyncio
+import copy
+import os
+import tempfile
+
+# Scratch cache database for the lesson snapshots
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test_cache.db")
+
+from server.main import generate_diff_sql, build_process_transcript_response, lesson_snapshots
+
+VIDEO_ID = "diffvideo01"
+URL = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+
+PREVIOUS = {
+    "video_id": VIDEO_ID,
+    "transcript": [
+        {"text": "Good morning.", "start": 0.0, "end": 2.0, "text_translate": "Buen día.",
+         "vocabulary": [{"original_word": "morning", "translation": "mañana", "notes": None}]},
+        {"text": "Let's begin.", "start": 2.0, "end": 4.0, "text_translate": "Empecemos.",
+         "vocabulary": []},
+        {"text": "See you soon.", "start": 4.0, "end": 6.0, "text_translate": "Hasta pronto.",
+         "vocabulary": [{"original_word": "soon", "translation": "pronto", "notes": None}]}
+    ]
+}
+
+def reprocessed():
+    data = copy.deepcopy(PREVIOUS)
+    data["transcript"][0]["text_translate"] = "Buenos días."
+    data["transcript"][1]["vocabulary"].append({"original_word": "begin", "translation": "empezar", "notes": "verb"})
+    del data["transcript"][2]
+    return data
+
+def test_generate_diff_sql():
+    sql = generate_diff_sql(PREVIOUS, reprocessed(), VIDEO_ID, "Diff lesson")
+    assert sql.startswith("BEGIN;") and sql.endswith("COMMIT;")
+    assert ("clips_inserted=0, clips_updated=1, clips_deleted=1, "
+            "vocabulary_inserted=1, vocabulary_updated=0, vocabulary_deleted=0") in sql
+
+    assert "UPDATE public.clips SET translated_text = 'Buenos días.', order_index = 1" in sql
+    assert "'begin', 'empezar', 'verb'" in sql
+    assert "DELETE FROM public.vocabulary WHERE clip_id = (SELECT id FROM public.clips WHERE" in sql
+    assert "DELETE FROM public.clips WHERE" in sql and "original_text = 'See you soon.'" in sql
+    # The removed clip is deleted before anything is updated or inserted
+    assert sql.index("DELETE FROM public.clips") < sql.index("UPDATE public.clips") < sql.index("INSERT INTO public.vocabulary")
+    assert "UPDATE public.lessons SET duration = '4'" in sql
+    assert "INSERT INTO public.lessons" not in sql
+    print("✅ Diff SQL: one translation updated, one vocabulary entry added, one clip removed")
+
+    assert generate_diff_sql(PREVIOUS, copy.deepcopy(PREVIOUS), VIDEO_ID).startswith("-- Sin cambios")
+    print("✅ No statements when nothing changed")
+
+async def respond(processed_data, sql_format):
+    return await build_process_transcript_response(
+        processed_data, VIDEO_ID, URL, "Diff lesson", sql_format, False, {}
+    )
+
+async def run_snapshot_flow():
+    # Generated SQL does not become the stored version until it is acknowledged
+    first = await respond(PREVIOUS, "statements")
+    assert lesson_snapshots.get(VIDEO_ID) is None
+    second = await respond(reprocessed(), "diff")
+    assert "INSERT INTO public.lessons" in second.sql_inserts
+    print("✅ Without an acknowledged version the diff falls back to full inserts")
+
+    assert not lesson_snapshots.acknowledge(VIDEO_ID, "unknown")
+    assert lesson_snapshots.acknowledge(VIDEO_ID, first.stats["snapshot_version"])
+    assert lesson_snapshots.get(VIDEO_ID) == PREVIOUS
+
+    third = await respond(reprocessed(), "diff")
+    assert "clips_updated=1, clips_deleted=1" in third.sql_inserts
+    assert lesson_snapshots.get(VIDEO_ID) == PREVIOUS
+    print("✅ After the acknowledgement the diff is computed against the applied version")
+
+def test_snapshot_advances_only_on_acknowledge():
+    asyncio.run(run_snapshot_flow())
+
+if __name__ == "__main__":
+    print("🚀 Iniciando prueba del SQL incremental...")
+    test_generate_diff_sql()
+    test_snapshot_advances_only_on_acknowledge()
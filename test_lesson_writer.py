@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the direct database loader with the local SQLite backend
+"""
+
+import os
+import sqlite3
+import tempfile
+
+# Scratch cache database for the server module
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test_cache.db")
+
+from server.main import SQLiteLessonWriter
+
+PROCESSED_DATA = {
+    "video_id": "writer00001",
+    "transcript": [
+        {
+            "text": "Hello everyone.",
+            "start": 0.0,
+            "end": 2.5,
+            "text_translate": "Hola a todos.",
+            "vocabulary": [
+                {"original_word": "everyone", "translation": "todos", "notes": None}
+            ]
+        },
+        {
+            "text": "Let's get started.",
+            "start": 2.5,
+            "end": 4.0,
+            "text_translate": "Empecemos.",
+            "vocabulary": [
+                {"original_word": "get started", "translation": "empezar", "notes": "phrasal verb"},
+                {"original_word": "let's", "translation": "vamos a", "notes": None}
+            ]
+        }
+    ]
+}
+
+def count(conn, table):
+    return conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+def test_sqlite_lesson_writer():
+    path = os.path.join(tempfile.mkdtemp(), "lessons.db")
+    writer = SQLiteLessonWriter(path)
+    result = writer.write(PROCESSED_DATA, "writer00001", "https://www.youtube.com/watch?v=writer00001", "Writer lesson")
+
+    assert result["backend"] == "sqlite"
+    assert result["rows"] == {"lessons": 1, "clips": 2, "vocabulary": 3}
+    assert result["rows_per_second"] is None or result["rows_per_second"] > 0
+    assert result["transaction_seconds"] >= 0
+    print(f"✅ Lesson loaded: {result['rows']} at {result['rows_per_second']} rows/s")
+
+    with sqlite3.connect(path) as conn:
+        assert count(conn, "lessons") == 1
+        assert count(conn, "clips") == 2
+        assert count(conn, "vocabulary") == 3
+        lesson_id, created_at = conn.execute("SELECT id, created_at FROM lessons").fetchone()
+        assert lesson_id == result["lesson_id"]
+        assert created_at.endswith("+00:00")
+        orders = [row[0] for row in conn.execute(
+            "SELECT order_index FROM clips WHERE lesson_id = ? ORDER BY order_index", (lesson_id,)
+        )]
+        assert orders == [1, 2]
+    print("✅ Rows are stored with their lesson, order and UTC timestamps")
+
+if __name__ == "__main__":
+    print("🚀 Iniciando prueba del loader SQLite...")
+    test_sqlite_lesson_writer()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for the QA agent LLM response cache and token accounting, against a local
+stand-in for the OpenAI chat completions API
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Configure the client module before importing it: local OpenAI API and scratch databases
+STAND_IN_PORT = 8766
+scratch = tempfile.mkdtemp()
+os.environ["OPENAI_API_KEY"] = "test-key"
+os.environ.setdefault("QA_API_KEY", "test-server-key")
+os.environ.setdefault("QA_API_KEY_CLIENT", "test-client-key")
+os.environ.setdefault("MONITOR_DB_PATH", os.path.join(scratch, "qa_monitors.db"))
+os.environ["CRAWL_PREFETCH_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "client"))
+from main import QAAgent
+
+ANSWER = "PASSED: The page has no spelling errors.\nCONFIDENCE: high"
+USAGE = {"prompt_tokens": 120, "completion_tokens": 12, "total_tokens": 132}
+completions_received = []
+
+class ChatCompletionsHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        completions_received.append(body)
+        message = {"role": "assistant", "content": ANSWER}
+        if body.get("stream"):
+            chunks = [
+                {"choices": [{"index": 0, "delta": message, "finish_reason": None}]},
+                {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            ]
+            # Like the OpenAI API, streamed usage is only sent when the client asks for it
+            if (body.get("stream_options") or {}).get("include_usage"):
+                chunks.append({"choices": [], "usage": USAGE})
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for chunk in chunks:
+                chunk.update({"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": body["model"]})
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+        response = {
+            "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": USAGE
+        }
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+async def run_twice():
+    # The agent reads its models and cache settings when it is created
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STAND_IN_PORT}/v1"
+    os.environ["LLM_CACHE_ENABLED"] = "true"
+    os.environ["LLM_CACHE_PATH"] = os.path.join(scratch, "llm_cache.db")
+    os.environ["QA_MODEL_CASCADE"] = "gpt-4o-mini"
+    agent = QAAgent()
+    try:
+        prompt = "Check the welcome text for spelling errors: 'Welcome to our store'"
+        first = await agent.process_request(prompt)
+        second = await agent.process_request(prompt)
+    finally:
+        await agent.close()
+    return first, second
+
+def test_llm_cache_and_token_usage():
+    server = HTTPServer(("127.0.0.1", STAND_IN_PORT), ChatCompletionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        first, second = asyncio.run(run_twice())
+    finally:
+        server.shutdown()
+
+    assert first["status"] == "passed"
+    assert first["tokens"] == USAGE
+    assert first["cascade"][0]["cost_usd"] > 0
+    print(f"✅ Token usage reported: {first['tokens']}, cost ${first['cascade'][0]['cost_usd']}")
+
+    assert first["llm_cache"]["misses"] == 1 and first["llm_cache"]["hits"] == 0
+    assert second["llm_cache"]["hits"] == 1 and second["llm_cache"]["misses"] == 0
+    assert len(completions_received) == 1
+    assert second["status"] == "passed" and second["console_logs"] == first["console_logs"]
+    print("✅ The second identical run is answered from the LLM cache")
+
+    # A cached answer costs nothing
+    assert second["tokens"]["total_tokens"] == 0
+    assert second["cascade"][0]["cost_usd"] == 0
+    print("✅ Cached answers do not count tokens or cost")
+
+if __name__ == "__main__":
+    print("🚀 Starting LLM cache test...")
+    test_llm_cache_and_token_usage()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Load test: verifies that concurrent /process-prompt requests overlap on the
+QA client API instead of being handled one at a time.
+"""
+
+import os
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_URL = os.getenv("LOAD_TEST_CLIENT_URL", "http://localhost:8001")
+API_KEY = os.getenv("QA_API_KEY_CLIENT", "your_qa_api_key_client_here")
+HEADERS = {
+    "Content-Type": "application/json",
+    "X-API-Key": API_KEY
+}
+
+PROMPT = "Crawl https://example.com and verify that the page content has no spelling errors"
+CONCURRENT_PROMPTS = int(os.getenv("LOAD_TEST_CONCURRENT_PROMPTS", 4))
+
+def timed_prompt(index):
+    start = time.perf_counter()
+    response = requests.post(f"{BASE_URL}/process-prompt", json={"prompt": PROMPT}, headers=HEADERS, timeout=600)
+    end = time.perf_counter()
+    return index, start, end, response.status_code
+
+def test_concurrent_prompts_overlap():
+    # Baseline: one prompt on its own
+    _, start, end, status_code = timed_prompt(-1)
+    baseline = end - start
+    assert status_code == 200, "Baseline prompt failed"
+    print(f"📊 Single prompt latency: {baseline:.2f}s")
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENT_PROMPTS) as pool:
+        results = list(pool.map(timed_prompt, range(CONCURRENT_PROMPTS)))
+    wall_time = time.perf_counter() - wall_start
+
+    for index, start, end, status_code in results:
+        print(f"   prompt {index}: {status_code} from +{start - wall_start:.2f}s to +{end - wall_start:.2f}s")
+
+    latencies = [end - start for _, start, end, _ in results]
+    serialized_estimate = baseline * CONCURRENT_PROMPTS
+    print(f"📊 Wall time: {wall_time:.2f}s, slowest prompt: {max(latencies):.2f}s, "
+          f"serialized estimate: {serialized_estimate:.2f}s")
+
+    assert all(status_code == 200 for _, _, _, status_code in results), "Some prompts failed"
+    # Serialized handling would take about one baseline latency per prompt
+    assert wall_time < serialized_estimate * 0.75, "Prompts were processed one at a time"
+    print("✅ Concurrent prompts overlapped on the client API")
+
+if __name__ == "__main__":
+    print(f"🚀 Load test against {BASE_URL} with {CONCURRENT_PROMPTS} concurrent prompts")
+    test_concurrent_prompts_overlap()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Load test: verifies that /crawl latency stays flat while /youtube-transcript
+requests are running on the same server.
+"""
+
+import os
+import time
+import statistics
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_URL = os.getenv("LOAD_TEST_SERVER_URL", "http://localhost:8000")
+API_KEY = os.getenv("QA_API_KEY", "your_api_key_here")
+HEADERS = {
+    "Content-Type": "application/json",
+    "x-api-key": API_KEY
+}
+
+CRAWL_URL = "https://example.com"
+VIDEO_URLS = [
+    "https://www.youtube.com/watch?v=ffyKY3Dj5ZE",
+    "https://www.youtube.com/watch?v=Vmb1tqYqyII",
+]
+
+CRAWL_REQUESTS = 10
+TRANSCRIPT_REQUESTS = 8
+
+def timed_crawl():
+    start = time.perf_counter()
+    response = requests.post(f"{BASE_URL}/crawl", json={"url": CRAWL_URL}, headers=HEADERS, timeout=120)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+def timed_transcript(video_url):
+    start = time.perf_counter()
+    response = requests.post(
+        f"{BASE_URL}/youtube-transcript",
+        json={"url": video_url, "translate_code": "es"},
+        headers=HEADERS,
+        timeout=120
+    )
+    return time.perf_counter() - start, response.status_code
+
+def measure_crawl_latency(label):
+    latencies = [timed_crawl() for _ in range(CRAWL_REQUESTS)]
+    print(f"📊 {label}: p50={statistics.median(latencies):.3f}s max={max(latencies):.3f}s")
+    return latencies
+
+def test_crawl_latency_during_transcripts():
+    # Warm up the crawler so browser startup is not counted
+    timed_crawl()
+
+    baseline = measure_crawl_latency("Crawl latency (idle)")
+
+    with ThreadPoolExecutor(max_workers=TRANSCRIPT_REQUESTS) as pool:
+        futures = [pool.submit(timed_transcript, VIDEO_URLS[i % len(VIDEO_URLS)]) for i in range(TRANSCRIPT_REQUESTS)]
+        under_load = measure_crawl_latency("Crawl latency (transcripts in flight)")
+        transcript_results = [f.result() for f in futures]
+
+    for elapsed, status_code in transcript_results:
+        print(f"   transcript request: {status_code} in {elapsed:.3f}s")
+
+    baseline_p50 = statistics.median(baseline)
+    load_p50 = statistics.median(under_load)
+    ratio = load_p50 / baseline_p50 if baseline_p50 else 0
+    print(f"📈 p50 ratio under load: {ratio:.2f}x")
+
+    # Allow some noise, but a blocked event loop shows up as a multi-second jump
+    assert load_p50 < baseline_p50 * 2 + 0.5, "Crawl latency degraded while transcripts were running"
+    print("✅ Crawl latency stayed flat while transcript requests were running")
+
+if __name__ == "__main__":
+    print(f"🚀 Load test against {BASE_URL}")
+    test_crawl_latency_during_transcripts()
@@ -92,6 +92,35 @@ def test_youtube_transcript():
     print(f"Transcript length: {len(data['transcript'])} characters")
     print(data)
 
+def test_process_transcript_stream():
+    """Test the streaming transcript processing endpoint (NDJSON events)"""
+    video_url = "https://www.youtube.com/watch?v=ffyKY3Dj5ZE"
+    payload = {
+        "url": video_url,
+        "prompt": "Traduce cada clip al español neutro y extrae vocabulario útil para estudiantes intermedios.",
+        "target_language": "es"
+    }
+    response = requests.post(f"{BASE_URL}/process-transcript/stream", json=payload, headers=HEADERS, stream=True)
+    assert response.status_code == 200
+    
+    events = []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        event = json.loads(line)
+        events.append(event)
+        if event["event"] == "clip":
+            print(f"🎬 Clip {event['index']}: {event['clip']['text_translate']}")
+    
+    assert events[0]["event"] == "lesson"
+    assert events[-1]["event"] == "done"
+    clip_events = [e for e in events if e["event"] == "clip"]
+    assert len(clip_events) == events[0]["clips"]
+    assert all("sql" in e for e in events)
+    print("✅ Test process-transcript stream endpoint passed")
+    print(f"Clips streamed: {len(clip_events)}")
+    print(f"Stats: {events[-1]['stats']}")
+
 def test_process_prompt():
     """Test the QA Agent API process-prompt endpoint"""
     # prompt = "Entra al contenido de comparasoftware.com y analiza si hay algun error de ortografia o contenido que no sea correcto"
@@ -295,6 +324,7 @@ def show_menu():
     print("2. Test crawl endpoint (/crawl)")
     print("3. Test browser agent endpoint (/browser-agent)")
     print("4. Test youtube transcript endpoint (/youtube-transcript)")
+    print("15. Test process transcript stream endpoint (/process-transcript/stream)")
     print()
     print("Client API Tests (localhost:8001):")
     print("5. Test client health endpoint (/health)")
@@ -336,6 +366,8 @@ def run_test(choice):
         test_asesor_webhook_curl()
     elif choice == 11:
         test_auditor_webhook_curl()
+    elif choice == 15:
+        test_process_transcript_stream()
     elif choice == 12:
         print("Running all server tests...")
         test_root()
@@ -366,7 +398,7 @@ def run_test(choice):
         test_asesor_webhook_curl()
         test_auditor_webhook_curl()
     else:
-        print("❌ Invalid choice. Please select a number between 0-14.")
+        print("❌ Invalid choice. Please select a number between 0-15.")
 
 if __name__ == "__main__":
     print("🧪 Starting API tests...\n")
@@ -379,13 +411,13 @@ if __name__ == "__main__":
     while True:
         show_menu()
         try:
-            choice = int(input("Enter your choice (0-14): "))
+            choice = int(input("Enter your choice (0-15): "))
             
             if choice == 0:
                 print("👋 Goodbye!")
                 break
             
-            if 1 <= choice <= 14:
+            if 1 <= choice <= 15:
                 try:
                     run_test(choice)
                     print("\n✨ Test(s) completed successfully!")
@@ -403,7 +435,7 @@ if __name__ == "__main__":
                 except Exception as e:
                     print(f"\n❌ Unexpected error: {str(e)}")
             else:
-                print("❌ Invalid choice. Please select a number between 0-14.")
+                print("❌ Invalid choice. Please select a number between 0-15.")
                 
         except ValueError:
             print("❌ Please enter a valid number.")
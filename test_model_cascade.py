@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the QA agent model cascade (escalation, per-tier tokens and cost), against a
+local stand-in for the OpenAI chat completions API
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Configure the client module before importing it
+STAND_IN_PORT = 8767
+scratch = tempfile.mkdtemp()
+os.environ["OPENAI_API_KEY"] = "test-key"
+os.environ.setdefault("QA_API_KEY", "test-server-key")
+os.environ.setdefault("QA_API_KEY_CLIENT", "test-client-key")
+os.environ.setdefault("MONITOR_DB_PATH", os.path.join(scratch, "qa_monitors.db"))
+os.environ["CRAWL_PREFETCH_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "client"))
+from main import QAAgent, MODEL_PRICES
+
+# The cheap model is unsure about the checkout prompt; the strong model is sure about everything
+ANSWERS = {
+    ("gpt-4o-mini", "checkout"): "PASSED: The checkout total looks right.\nCONFIDENCE: low",
+    ("gpt-4o-mini", "welcome"): "PASSED: No spelling errors in the welcome text.\nCONFIDENCE: high",
+    ("gpt-4o", "checkout"): "BUG_DETECTED: The checkout total ignores the discount.\nCONFIDENCE: high",
+}
+USAGE = {
+    "gpt-4o-mini": {"prompt_tokens": 1000, "completion_tokens": 100, "total_tokens": 1100},
+    "gpt-4o": {"prompt_tokens": 2000, "completion_tokens": 200, "total_tokens": 2200}
+}
+
+class ChatCompletionsHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][-1]["content"]
+        topic = "checkout" if "checkout" in prompt else "welcome"
+        response = {
+            "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": ANSWERS[(body["model"], topic)]},
+                "finish_reason": "stop"
+            }],
+            "usage": USAGE[body["model"]]
+        }
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def expected_cost(model):
+    input_price, output_price = MODEL_PRICES[model]
+    usage = USAGE[model]
+    return round((usage["prompt_tokens"] * input_price + usage["completion_tokens"] * output_price) / 1_000_000, 6)
+
+async def run_prompts():
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STAND_IN_PORT}/v1"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ["QA_MODEL_CASCADE"] = "gpt-4o-mini,gpt-4o"
+    os.environ["QA_CASCADE_MIN_CONFIDENCE"] = "medium"
+    agent = QAAgent()
+    try:
+        welcome = await agent.process_request("Check the welcome text 'Welcome to our store' for spelling errors")
+        checkout = await agent.process_request("Verify the checkout total applies the 10% discount")
+    finally:
+        await agent.close()
+    return agent, welcome, checkout
+
+def test_model_cascade():
+    server = HTTPServer(("127.0.0.1", STAND_IN_PORT), ChatCompletionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        agent, welcome, checkout = asyncio.run(run_prompts())
+    finally:
+        server.shutdown()
+
+    assert welcome["status"] == "passed"
+    assert [tier["model"] for tier in welcome["cascade"]] == ["gpt-4o-mini"]
+    assert welcome["cascade"][0]["tokens"] == USAGE["gpt-4o-mini"]
+    assert welcome["cascade"][0]["cost_usd"] == expected_cost("gpt-4o-mini")
+    assert "CONFIDENCE" not in welcome["console_logs"]
+    print("✅ A confident answer from the cheap model is not escalated")
+
+    assert checkout["status"] == "failed"
+    cheap, strong = checkout["cascade"]
+    assert cheap["escalated"] and cheap["escalation_reason"] == "low_confidence"
+    assert strong["model"] == "gpt-4o" and not strong["escalated"]
+    assert strong["tokens"] == USAGE["gpt-4o"] and strong["cost_usd"] == expected_cost("gpt-4o")
+    assert checkout["tokens"]["total_tokens"] == 1100 + 2200
+    print(f"✅ Low confidence escalated to gpt-4o: ${cheap['cost_usd']} + ${strong['cost_usd']}")
+
+    assert agent.cascade_stats["gpt-4o-mini"]["runs"] == 2
+    assert agent.cascade_stats["gpt-4o-mini"]["escalations"] == 1
+    assert agent.cascade_stats["gpt-4o"]["runs"] == 1
+    print("✅ Per-tier escalation stats are recorded")
+
+if __name__ == "__main__":
+    print("🚀 Starting model cascade test...")
+    test_model_cascade()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test script for the /process-transcript stage graph and its result cache, with stand-in
+transcript, metadata and LLM stages
+"""
+
+import asyncio
+import os
+import tempfile
+from unittest.mock import patch
+
+# Scratch cache database for the server module
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test_cache.db")
+
+import server.main as server
+from server.main import process_transcript_and_generate_sql, processed_result_cache, ProcessedResultCache
+
+VIDEO_ID = "pipeline001"
+URL = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+PROMPT = "Translate for learners"
+
+calls = {"transcript": 0, "process": 0}
+
+def fake_fetch_transcript(video_id):
+    calls["transcript"] += 1
+    return {"data": [{"text": "Hello there.", "start": 0.0, "duration": 2.0}], "language_code": "en"}
+
+async def fake_process_transcript_with_ai(transcript_data, prompt, video_id, url, target_language="es",
+                                          stats=None, force_refresh=False):
+    calls["process"] += 1
+    return {
+        "transcript": [{
+            "text": transcript_data[0]["text"], "start": 0.0, "end": 2.0, "text_translate": "Hola.",
+            "vocabulary": [{"original_word": "there", "translation": "ahí", "notes": None}]
+        }],
+        "video_id": video_id,
+        "url": url,
+        "language": "en"
+    }
+
+async def fake_metadata_get(video_id):
+    return {"title": f"Lesson {video_id}", "author": "Teacher", "duration": None}
+
+def stand_in_stages():
+    return [
+        patch.object(server, "fetch_transcript", fake_fetch_transcript),
+        patch.object(server, "process_transcript_with_ai", fake_process_transcript_with_ai),
+        patch.object(server.video_metadata, "get", fake_metadata_get)
+    ]
+
+async def run_pipeline():
+    first = await process_transcript_and_generate_sql(URL, PROMPT)
+    assert first.stats["result_cache"] == "miss"
+    assert set(first.stats["timings"]) >= {"metadata", "transcript", "process", "sql", "cache", "total"}
+    assert "INSERT INTO public.lessons" in first.sql_inserts and f"'Lesson {VIDEO_ID}'" in first.sql_inserts
+    print(f"✅ Stage graph finished with timings {first.stats['timings']}")
+
+    cached = processed_result_cache.get(VIDEO_ID, ProcessedResultCache.prompt_hash(PROMPT, "es"), server.TRANSCRIPT_MODEL)
+    assert cached["title"] == f"Lesson {VIDEO_ID}"
+    assert cached["processed_data"] == first.processed_data
+    assert cached["sql_inserts"] == first.sql_inserts
+
+    second = await process_transcript_and_generate_sql(URL, PROMPT)
+    assert second.stats["result_cache"] == "hit"
+    assert second.sql_inserts == first.sql_inserts
+    assert calls == {"transcript": 1, "process": 1}
+    print("✅ The result is cached and the second request skips the transcript and LLM stages")
+
+async def run_vocabulary_store_change():
+    url = "https://www.youtube.com/watch?v=pipeline002"
+    per_clip = await process_transcript_and_generate_sql(url, PROMPT)
+    assert "vocabulary_dictionary" not in per_clip.sql_inserts
+
+    server.VOCABULARY_STORE = "dictionary"
+    try:
+        dictionary = await process_transcript_and_generate_sql(url, PROMPT)
+    finally:
+        server.VOCABULARY_STORE = "per_clip"
+    assert dictionary.stats["result_cache"] == "hit"
+    assert "INSERT INTO public.vocabulary_dictionary" in dictionary.sql_inserts
+    assert "INSERT INTO public.vocabulary " not in dictionary.sql_inserts
+    print("✅ Cached SQL is regenerated when VOCABULARY_STORE changes")
+
+def run_with_stand_in_stages(pipeline):
+    patches = stand_in_stages()
+    for stand_in in patches:
+        stand_in.start()
+    try:
+        asyncio.run(pipeline())
+    finally:
+        for stand_in in patches:
+            stand_in.stop()
+
+def test_process_transcript_pipeline():
+    run_with_stand_in_stages(run_pipeline)
+
+def test_cached_sql_follows_vocabulary_store():
+    run_with_stand_in_stages(run_vocabulary_store_change)
+
+if __name__ == "__main__":
+    print("🚀 Iniciando prueba del pipeline de transcripciones...")
+    test_process_transcript_pipeline()
+    test_cached_sql_follows_vocabulary_store()
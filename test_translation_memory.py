@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script for exact and near-duplicate matches of the translation memory
+"""
+
+import os
+import tempfile
+from unittest.mock import patch
+
+# Scratch cache database for the translation memory
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test_cache.db")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import asyncio
+import server.main as server
+from server.main import TranslationMemory, stream_clip_translations
+
+SOURCE = "When you finish the exercise, you should check your answers carefully before you move on to the next lesson."
+TRANSLATION = {
+    "text_translate": "Cuando termines el ejercicio, deberías revisar tus respuestas con cuidado antes de pasar a la siguiente lección.",
+    "vocabulary": [{"original_word": "check", "translation": "revisar", "notes": None}]
+}
+
+PROMPT = "Translate for Spanish-speaking learners"
+PROMPT_HASH = TranslationMemory.prompt_hash(PROMPT, "gpt-4o")
+
+def test_translation_memory_matches():
+    memory = TranslationMemory(similarity=0.95)
+    memory.store_many([(SOURCE, TRANSLATION)], "es", PROMPT_HASH)
+
+    found = memory.lookup_many([SOURCE.upper().replace(",", "")], "es", PROMPT_HASH)
+    assert found[0]["match"] == "exact"
+    assert found[0]["text_translate"] == TRANSLATION["text_translate"]
+    print("✅ Case and punctuation changes are exact matches")
+
+    stutter = SOURCE.replace("you should check", "you you should check")
+    found = memory.lookup_many([stutter], "es", PROMPT_HASH)
+    assert found[0]["match"] == "near"
+    print("✅ A repeated word is a near-duplicate match")
+
+    # "not" keeps the character similarity above 0.95 but inverts the meaning
+    negation = SOURCE.replace("you should check", "you should not check")
+    changed = SOURCE.replace("next lesson", "last lesson")
+    assert memory.lookup_many([negation, changed], "es", PROMPT_HASH) == {}
+    print("✅ Added or changed words are never served from the memory")
+
+    other_prompt = TranslationMemory.prompt_hash("Translate formally", "gpt-4o")
+    assert memory.lookup_many([SOURCE], "es", other_prompt) == {}
+    assert memory.lookup_many([SOURCE], "es", TranslationMemory.prompt_hash(PROMPT, "gpt-4o-mini")) == {}
+    print("✅ Entries are only reused for the same prompt and model")
+
+async def fake_chunk_stream(llm, chunk, prompt, clips):
+    # Stand-in for the LLM stage: one fresh translation per clip of the window
+    for i in chunk["indexes"]:
+        yield i, {"text_translate": f"nueva {i}", "vocabulary": []}
+
+async def collect_translations(clips, force_refresh):
+    stats = {}
+    translations = {}
+    async for i, translation in stream_clip_translations(clips, PROMPT, "es", stats, force_refresh):
+        translations[i] = translation
+    return translations, stats["translation_memory"]
+
+def test_force_refresh_skips_translation_memory():
+    with patch.object(server, "stream_transcript_chunk_with_ai", fake_chunk_stream):
+        clips = [{"text": "We are going to learn the past simple today.", "start": 0.0, "end": 3.0}]
+
+        translations, memory_stats = asyncio.run(collect_translations(clips, False))
+        assert translations[0]["text_translate"] == "nueva 0" and memory_stats["misses"] == 1
+
+        server.translation_memory.store_many(
+            [(clips[0]["text"], {"text_translate": "vieja", "vocabulary": []})], "es",
+            TranslationMemory.prompt_hash(PROMPT, server.TRANSCRIPT_MODEL)
+        )
+        translations, memory_stats = asyncio.run(collect_translations(clips, False))
+        assert translations[0]["text_translate"] == "vieja" and memory_stats["exact_hits"] == 1
+
+        translations, memory_stats = asyncio.run(collect_translations(clips, True))
+        assert translations[0]["text_translate"] == "nueva 0" and memory_stats["refresh"]
+        translations, _ = asyncio.run(collect_translations(clips, False))
+        assert translations[0]["text_translate"] == "nueva 0"
+    print("✅ force_refresh asks the LLM again and replaces the stored translation")
+
+if __name__ == "__main__":
+    print("🚀 Iniciando prueba de la memoria de traducción...")
+    test_translation_memory_matches()
+    test_force_refresh_skips_translation_memory()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script for the video metadata service against a local stand-in oEmbed server
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Configure the server module before importing it: local oEmbed and a scratch cache database
+STAND_IN_PORT = 8765
+os.environ["YOUTUBE_OEMBED_URL"] = f"http://127.0.0.1:{STAND_IN_PORT}/oembed"
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test_cache.db")
+
+from server.main import video_metadata, get_youtube_video_title
+
+requests_received = []
+
+class OEmbedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        video_id = parse_qs(urlparse(query["url"][0]).query)["v"][0]
+        requests_received.append(video_id)
+        if video_id == "missing0000":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps({"title": f"Lesson {video_id} - YouTube", "author_name": "Teacher"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+async def test_video_metadata():
+    server = HTTPServer(("127.0.0.1", STAND_IN_PORT), OEmbedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        video_ids = ["video000001", "video000002", "video000003", "missing0000"]
+
+        metadata = await video_metadata.get_many(video_ids)
+        assert metadata["video000001"]["title"] == "Lesson video000001"
+        assert metadata["video000001"]["author"] == "Teacher"
+        assert metadata["missing0000"]["title"] == "Video missing0000"
+        assert sorted(requests_received) == sorted(video_ids)
+        print("✅ Batch lookup fetched every video once")
+
+        # Second lookup is served from the cache (failures are not cached)
+        await video_metadata.get_many(video_ids)
+        assert requests_received.count("video000001") == 1
+        assert requests_received.count("missing0000") == 2
+        print("✅ Cached metadata is not fetched again")
+
+        video_metadata.set_duration("video000002", 321.5)
+        assert (await video_metadata.get("video000002"))["duration"] == 321.5
+        assert get_youtube_video_title("video000003") == "Lesson video000003"
+        assert requests_received.count("video000003") == 1
+        print("✅ Duration and sync title lookups use the cache")
+    finally:
+        await video_metadata.close()
+        server.shutdown()
+
+if __name__ == "__main__":
+    print("🚀 Iniciando prueba del servicio de metadatos de video...")
+    asyncio.run(test_video_metadata())
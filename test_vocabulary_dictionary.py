@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for the deduplicated vocabulary dictionary store (VOCABULARY_STORE=dictionary)
+"""
+
+import copy
+import os
+import sqlite3
+import tempfile
+
+# Scratch cache database for the server module
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test_cache.db")
+
+import server.main as server
+
+VIDEO_ID = "dictvideo01"
+URL = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+PROCESSED_DATA = {
+    "video_id": VIDEO_ID,
+    "transcript": [
+        {"text": "Good morning.", "start": 0.0, "end": 2.0, "text_translate": "Buenos días.",
+         "vocabulary": [{"original_word": "morning", "translation": "mañana", "notes": None}]},
+        {"text": "Every morning I run.", "start": 2.0, "end": 4.0, "text_translate": "Cada mañana corro.",
+         "vocabulary": [{"original_word": "Morning", "translation": "mañana", "notes": "noun"},
+                        {"original_word": "run", "translation": "correr", "notes": None}]}
+    ]
+}
+
+def test_scripts_create_dictionary_tables():
+    server.VOCABULARY_STORE = "dictionary"
+    try:
+        changed = copy.deepcopy(PROCESSED_DATA)
+        changed["transcript"][1]["vocabulary"].append({"original_word": "every", "translation": "cada", "notes": None})
+        scripts = {
+            "statements": server.generate_sql_inserts(PROCESSED_DATA, VIDEO_ID, URL, "Dictionary lesson"),
+            "bulk": server.generate_bulk_sql_inserts(PROCESSED_DATA, VIDEO_ID, URL, "Dictionary lesson"),
+            "diff": server.generate_diff_sql(PROCESSED_DATA, changed, VIDEO_ID, "Dictionary lesson")
+        }
+        for name, sql in scripts.items():
+            create = sql.index("CREATE TABLE IF NOT EXISTS public.vocabulary_dictionary")
+            assert sql.index("CREATE TABLE IF NOT EXISTS public.clip_vocabulary") > create
+            assert sql.index("INSERT INTO public.vocabulary_dictionary") > create
+            assert sql.index("INSERT INTO public.clip_vocabulary") > create
+            assert "INSERT INTO public.vocabulary " not in sql
+            print(f"✅ {name}: dictionary tables are created before they are used")
+
+        # "morning" appears twice with the same translation: one dictionary entry, two links
+        assert scripts["statements"].count(server.vocabulary_dictionary_id(
+            server.vocabulary_word_key({"original_word": "morning", "translation": "mañana"})
+        )) == 3
+    finally:
+        server.VOCABULARY_STORE = "per_clip"
+
+    assert "vocabulary_dictionary" not in server.generate_sql_inserts(PROCESSED_DATA, VIDEO_ID, URL, "Per-clip lesson")
+    print("✅ per_clip scripts do not touch the dictionary tables")
+
+def test_sqlite_writer_deduplicates_dictionary():
+    server.VOCABULARY_STORE = "dictionary"
+    try:
+        path = os.path.join(tempfile.mkdtemp(), "lessons.db")
+        writer = server.SQLiteLessonWriter(path)
+        first = writer.write(PROCESSED_DATA, VIDEO_ID, URL, "Dictionary lesson")
+        writer.write(PROCESSED_DATA, VIDEO_ID, URL, "Dictionary lesson")
+    finally:
+        server.VOCABULARY_STORE = "per_clip"
+
+    assert first["rows"] == {"lessons": 1, "clips": 2, "vocabulary": 0, "vocabulary_dictionary": 2, "clip_vocabulary": 3}
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT count(*) FROM vocabulary_dictionary").fetchone()[0] == 2
+        assert conn.execute("SELECT count(*) FROM clip_vocabulary").fetchone()[0] == 6
+        notes = conn.execute("SELECT notes FROM clip_vocabulary WHERE notes IS NOT NULL").fetchall()
+        assert notes == [("noun",), ("noun",)]
+    print("✅ Two loads of the same lesson share two dictionary entries")
+
+if __name__ == "__main__":
+    print("🚀 Iniciando prueba del diccionario de vocabulario...")
+    test_scripts_create_dictionary_tables()
+    test_sqlite_writer_deduplicates_dictionary()